@@ -0,0 +1,124 @@
+# browser_startup.py - Compares cold start time and memory of the chrome launch profiles, linux only (reads /proc)
+# Usage: python benchmarks/browser_startup.py --runs 5 --headless
+#        python benchmarks/browser_startup.py --runs 5 --headless --url https://www.bing.com/
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import fixture_server  # noqa: E402
+import ms_rewards  # noqa: E402
+
+
+def child_pids(root_pid):
+    """
+    Finds a process and all of its descendants through /proc
+    :param root_pid: Int
+    :return: list of Int pids, root first
+    """
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # the process name may contain spaces, the fields after it are state then parent pid
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(child for child, parent in parents.items() if parent == pid)
+    return pids
+
+
+def memory_kb(pid, field):
+    """
+    Reads one memory field of a process
+    :param pid: Int
+    :param field: VmRSS from /proc/<pid>/status or Pss from /proc/<pid>/smaps_rollup
+    :return: Int kB, 0 if the process is gone or the field is not readable
+    """
+    path = f'/proc/{pid}/smaps_rollup' if field == 'Pss' else f'/proc/{pid}/status'
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def bench_profile(profile, args, url):
+    """
+    Starts and quits a browser runs times with one launch profile
+    :param profile: name of one of ms_rewards.LAUNCH_PROFILES
+    :param args: argparse object
+    :param url: String page loaded before memory is measured
+    :return: dict of medians
+    """
+    start_times = []
+    load_times = []
+    rss = []
+    pss = []
+    for _ in range(args.runs):
+        start_time = time.perf_counter()
+        browser = ms_rewards.browser_setup(args.headless, ms_rewards.PC_USER_AGENT, profile)
+        try:
+            start_times.append((time.perf_counter() - start_time) * 1000)
+            start_time = time.perf_counter()
+            browser.get(url)
+            load_times.append((time.perf_counter() - start_time) * 1000)
+            # rss counts pages shared between chrome processes once per process, pss splits them
+            pids = child_pids(browser.service.process.pid)
+            rss.append(sum(memory_kb(pid, 'VmRSS') for pid in pids) / 1024)
+            pss.append(sum(memory_kb(pid, 'Pss') for pid in pids) / 1024)
+        finally:
+            browser.quit()
+    return {
+        'profile': profile,
+        'start_ms': statistics.median(start_times),
+        'load_ms': statistics.median(load_times),
+        'rss_mb': statistics.median(rss),
+        'pss_mb': statistics.median(pss),
+    }
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--runs', default=3, type=int, help='Browser starts per profile, default is 3.')
+    arg_parser.add_argument('--headless', action='store_true', default=False, help='Runs chrome headless.')
+    arg_parser.add_argument('--url', help='Page loaded before measuring memory, default is the fixture server search page.')
+    arg_parser.add_argument(
+        '--launch-profile',
+        action='append',
+        choices=sorted(ms_rewards.LAUNCH_PROFILES),
+        dest='profiles',
+        help=f'Profile to benchmark, can be repeated, default is all of {sorted(ms_rewards.LAUNCH_PROFILES)}.')
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # browser_setup keeps chromedriver next to ms_rewards.py
+    os.chdir(os.path.dirname(os.path.realpath(ms_rewards.__file__)))
+    server = None
+    url = args.url
+    if not url:
+        server, base_url = fixture_server.start_server()
+        ms_rewards.set_base_url(base_url)
+        url = f'{ms_rewards.BING_SEARCH_URL}?q=benchmark'
+    try:
+        results = [bench_profile(profile, args, url) for profile in args.profiles or sorted(ms_rewards.LAUNCH_PROFILES)]
+    finally:
+        if server:
+            server.shutdown()
+    print(f'{"profile":<8} {"start ms":>9} {"load ms":>9} {"rss MB":>8} {"pss MB":>8}')
+    for result in results:
+        print(f'{result["profile"]:<8} {result["start_ms"]:>9.0f} {result["load_ms"]:>9.0f} '
+              f'{result["rss_mb"]:>8.0f} {result["pss_mb"]:>8.0f}')
@@ -0,0 +1,187 @@
+# end_to_end.py - Times each phase of an account run against the local fixture server, saves the results as json
+# Usage: python benchmarks/end_to_end.py --runs 5 --headless
+#        python benchmarks/end_to_end.py --runs 5 --headless --compare benchmarks/results/<earlier run>.json
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import fixture_server  # noqa: E402
+import ms_rewards  # noqa: E402
+from search_submit import count_round_trips  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'results')
+
+
+def percentile(samples, fraction):
+    """
+    Nearest rank percentile
+    :param samples: list of numbers
+    :param fraction: float between 0 and 1
+    :return: the sample at that rank, None if there are no samples
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+
+class PhaseTimer(object):
+    """
+    Collects the latency and webdriver round trips of every timed phase
+    """
+
+    def __init__(self):
+        self.counter = None
+        self.latencies = defaultdict(list)
+        self.round_trips = defaultdict(list)
+
+    def time(self, phase, func, *args, **kwargs):
+        start_count = self.counter[0] if self.counter else 0
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.latencies[phase].append((time.perf_counter() - start_time) * 1000)
+            self.round_trips[phase].append((self.counter[0] if self.counter else 0) - start_count)
+
+    def timed(self, phase, func):
+        def timed_func(*args, **kwargs):
+            return self.time(phase, func, *args, **kwargs)
+        return timed_func
+
+    def summary(self):
+        return {
+            phase: {
+                'samples': len(latencies),
+                'p50_ms': percentile(latencies, 0.5),
+                'p95_ms': percentile(latencies, 0.95),
+                'round_trips': sum(self.round_trips[phase]) / len(latencies),
+                'latencies_ms': latencies,
+            } for phase, latencies in sorted(self.latencies.items())
+        }
+
+
+def time_offer_handlers(timer):
+    """
+    Wraps every offer handler so each offer type gets its own phase
+    :param timer: PhaseTimer obj
+    :return: None
+    """
+    ms_rewards.OFFER_TYPES[:] = [(name, selector, timer.timed(f'dailies.{name}', handler))
+                                 for name, selector, handler in ms_rewards.OFFER_TYPES]
+    # pages of unknown type are explored, see run_offer()
+    ms_rewards.explore_daily = timer.timed('dailies.explore', ms_rewards.explore_daily)
+
+
+def bench_run(timer, args, run, server):
+    """
+    Runs one account through every phase with a fresh browser and login
+    :param timer: PhaseTimer obj
+    :param args: argparse object
+    :param run: Int run number, makes the login and search terms unique
+    :param server: FixtureServer obj the run signs in to
+    :return: list of offer ids the run left incomplete, e.g. a quiz that stopped after its first question
+    """
+    email = f'bench{run}@example.com'
+    browser = timer.time('browser_setup', ms_rewards.browser_setup, args.headless, ms_rewards.PC_USER_AGENT,
+                         args.launch_profile)
+    try:
+        timer.counter = count_round_trips(browser)
+        timer.time('log_in', ms_rewards.log_in, browser, email, 'fixture')
+        browser.get(ms_rewards.BING_SEARCH_URL)
+        for i in range(args.queries):
+            timer.time(f'search.{args.method}', ms_rewards.submit_search, browser, f'benchmark {run} {i}', args.method)
+        timer.time('iter_dailies', ms_rewards.iter_dailies, browser, args.tabs)
+        timer.time('get_point_total', ms_rewards.get_point_total, browser)
+    finally:
+        timer.counter = None
+        browser.quit()
+    return sorted(set(dict(fixture_server.OFFERS)) - server.state.completed_offers(email))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(RESULTS_DIR)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_results(results):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f'{datetime.now().strftime("%Y%m%d-%H%M%S")}-{results["commit"]}.json')
+    ms_rewards.write_json_atomic(path, results)
+    return path
+
+
+def print_results(results, baseline=None):
+    baseline_phases = baseline['phases'] if baseline else {}
+    header = f'{"phase":<26} {"p50 ms":>9} {"p95 ms":>9} {"round trips":>12}'
+    print(header + (f' {"p50 vs " + baseline["commit"]:>16}' if baseline else ''))
+    for phase, result in results['phases'].items():
+        line = f'{phase:<26} {result["p50_ms"]:>9.0f} {result["p95_ms"]:>9.0f} {result["round_trips"]:>12.1f}'
+        if phase in baseline_phases and baseline_phases[phase]['p50_ms']:
+            change = result['p50_ms'] / baseline_phases[phase]['p50_ms'] - 1
+            line += f' {change:>+16.0%}'
+        print(line)
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--runs', default=3, type=int, help='Account runs, each with a new browser, default is 3.')
+    arg_parser.add_argument('--queries', default=10, type=int, help='Searches per run, default is 10.')
+    arg_parser.add_argument('--headless', action='store_true', default=False, help='Runs chrome headless.')
+    arg_parser.add_argument('--method', default='type', choices=ms_rewards.SEARCH_METHODS,
+                            help='Search submit method, default is type.')
+    arg_parser.add_argument('--tabs', default=1, type=int, help='Daily offers open at the same time, default is 1.')
+    arg_parser.add_argument('--launch-profile', default='full', choices=sorted(ms_rewards.LAUNCH_PROFILES),
+                            help='Chrome launch profile, default is full.')
+    arg_parser.add_argument('--compare', metavar='RESULTS_JSON', help='Earlier results to compare the p50s with.')
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    # browser_setup keeps chromedriver next to ms_rewards.py
+    os.chdir(os.path.dirname(os.path.realpath(ms_rewards.__file__)))
+    server, base_url = fixture_server.start_server()
+    ms_rewards.set_base_url(base_url)
+    timer = PhaseTimer()
+    time_offer_handlers(timer)
+    incomplete = Counter()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # keep the fixture offers out of the real offer type cache
+        ms_rewards.OFFER_TYPE_CACHE = os.path.join(cache_dir, 'offer_types.json')
+        try:
+            for run in range(args.runs):
+                incomplete.update(bench_run(timer, args, run, server))
+        finally:
+            server.shutdown()
+    results = {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'args': {key: value for key, value in vars(args).items() if key != 'compare'},
+        'phases': timer.summary(),
+        'incomplete_offers': dict(incomplete),
+    }
+    print_results(results, baseline)
+    print(f'Saved {save_results(results)}')
+    if incomplete:
+        # a run that leaves offers unfinished is a regression, not just a slow run
+        print('Offers left incomplete: ' + ', '.join(f'{offer} ({count} of {args.runs} runs)'
+                                                     for offer, count in sorted(incomplete.items())))
+        sys.exit(1)
@@ -0,0 +1,85 @@
+# search_submit.py - Compares per-query latency and webdriver round trips of the search submit methods
+# Usage: python benchmarks/search_submit.py --queries 10 --headless
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import ms_rewards  # noqa: E402
+
+
+def count_round_trips(browser):
+    """
+    Wraps the webdriver so every command sent to chromedriver is counted
+    :param browser: webdriver obj
+    :return: list with one int, the number of commands sent so far
+    """
+    counter = [0]
+    execute = browser.execute
+
+    def counted_execute(driver_command, params=None):
+        counter[0] += 1
+        return execute(driver_command, params)
+
+    browser.execute = counted_execute
+    return counter
+
+
+def bench_method(browser, counter, method, queries):
+    """
+    Submits queries searches with one method
+    :param browser: webdriver obj
+    :param counter: round trip counter from count_round_trips
+    :param method: one of ms_rewards.SEARCH_METHODS
+    :param queries: Int number of searches
+    :return: dict of latencies in ms and round trips per query
+    """
+    browser.get(ms_rewards.BING_SEARCH_URL)
+    latencies = []
+    round_trips = []
+    for i in range(queries):
+        term = f'{method} benchmark {i} {time.time():.0f}'
+        start_count = counter[0]
+        start_time = time.perf_counter()
+        ms_rewards.submit_search(browser, term, method)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        round_trips.append(counter[0] - start_count)
+    return {
+        'method': method,
+        'p50_ms': statistics.median(latencies),
+        'mean_ms': statistics.mean(latencies),
+        'round_trips': statistics.mean(round_trips),
+    }
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--queries', default=10, type=int, help='Searches per method, default is 10.')
+    arg_parser.add_argument('--headless', action='store_true', default=False, help='Runs chrome headless.')
+    arg_parser.add_argument(
+        '--method',
+        action='append',
+        choices=ms_rewards.SEARCH_METHODS,
+        dest='methods',
+        help=f'Method to benchmark, can be repeated, default is all of {ms_rewards.SEARCH_METHODS}.')
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # browser_setup keeps chromedriver next to ms_rewards.py
+    os.chdir(os.path.dirname(os.path.realpath(ms_rewards.__file__)))
+    browser = ms_rewards.browser_setup(args.headless, ms_rewards.PC_USER_AGENT)
+    try:
+        counter = count_round_trips(browser)
+        results = [bench_method(browser, counter, method, args.queries)
+                   for method in args.methods or ms_rewards.SEARCH_METHODS]
+    finally:
+        browser.quit()
+    print(f'{"method":<8} {"p50 ms":>9} {"mean ms":>9} {"round trips":>12}')
+    for result in results:
+        print(f'{result["method"]:<8} {result["p50_ms"]:>9.0f} {result["mean_ms"]:>9.0f} {result["round_trips"]:>12.1f}')
@@ -0,0 +1,236 @@
+# fixture_server.py - Local stand-in for the Bing and Rewards pages the bot drives, serves the pages in fixtures/
+# Usage: python fixture_server.py --port 8000
+#        python ms_rewards.py --headless --all --base-url http://127.0.0.1:8000
+
+import argparse
+import http.server
+import json
+import logging
+import os
+import socketserver
+import threading
+import uuid
+from html import escape
+from http.cookies import SimpleCookie
+from string import Template
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fixtures')
+SESSION_COOKIE = 'MSRB_SESSION'
+POINTS_PER_SEARCH = 5
+POINTS_PER_OFFER = 10
+STARTING_POINTS = 1000
+# search point caps, mobile searches are told apart by the user agent
+SEARCH_POINT_CAPS = {'pc': 150, 'mobile': 100}
+# (offer id, dashboard title), each id has a page in fixtures/offers/
+OFFERS = [
+    ('explore', 'Explore on Bing'),
+    ('poll', 'Daily poll'),
+    ('lightning', 'Lightning quiz'),
+    ('dragdrop', 'Drag and drop quiz'),
+    ('clickquiz', 'This or that quiz'),
+]
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FixtureState(object):
+    """
+    Points and completed offers of every signed in session, kept in memory for the life of the server
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def new_session(self, email):
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = {'email': email, 'pc': 0, 'mobile': 0, 'offers': set()}
+        return session_id
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return dict(session, offers=set(session['offers'])) if session else None
+
+    def credit_search(self, session_id, mode):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session:
+                session[mode] = min(session[mode] + POINTS_PER_SEARCH, SEARCH_POINT_CAPS[mode])
+
+    def complete_offer(self, session_id, offer):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session and offer in dict(OFFERS):
+                session['offers'].add(offer)
+
+    def completed_offers(self, email):
+        """
+        :param email: String the sessions signed in with
+        :return: set of offer ids completed by any session of the email
+        """
+        with self.lock:
+            return set().union(*(session['offers'] for session in self.sessions.values() if session['email'] == email))
+
+    @staticmethod
+    def total(session):
+        return STARTING_POINTS + session['pc'] + session['mobile'] + POINTS_PER_OFFER * len(session['offers'])
+
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    server_version = 'FixtureServer/1.0'
+
+    def log_message(self, format, *args):
+        logging.debug(msg=f'{self.address_string()} {format % args}')
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def session_id(self):
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        if SESSION_COOKIE in cookie and self.state.get(cookie[SESSION_COOKIE].value):
+            return cookie[SESSION_COOKIE].value
+        return None
+
+    def send_body(self, body, content_type='text/html; charset=utf-8', status=200, headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'no-store')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location, headers=None):
+        self.send_response(303)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        session_id = self.session_id()
+        if url.path == '/login':
+            self.send_body(load_fixture('login.html'))
+        elif url.path == '/rewards/dashboard':
+            if session_id:
+                self.send_body(self.dashboard(self.state.get(session_id)))
+            else:
+                self.redirect('/login')
+        elif url.path == '/search':
+            term = query.get('q', [''])[0]
+            if term and session_id:
+                mode = 'mobile' if 'Mobile' in self.headers.get('User-Agent', '') else 'pc'
+                self.state.credit_search(session_id, mode)
+            self.send_body(self.search_results(term))
+        elif url.path == '/rewardsapp/bepflyoutpage':
+            if session_id:
+                self.send_body(self.flyout(self.state.get(session_id)))
+            else:
+                self.send_body('<html><body>Sign in to see your points</body></html>')
+        elif url.path == '/trends/api/dailytrends':
+            self.send_body(")]}',\n" + self.daily_trends(query.get('ed', [''])[0]),
+                           content_type='application/json; charset=utf-8')
+        elif url.path.startswith('/offers/') and url.path[len('/offers/'):] in dict(OFFERS):
+            self.send_body(load_fixture(os.path.join('offers', url.path[len('/offers/'):] + '.html')))
+        elif url.path == '/':
+            self.redirect('/search')
+        else:
+            self.send_body('<html><body>Not found</body></html>', status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if url.path == '/login':
+            session_id = self.state.new_session(form.get('loginfmt', [''])[0])
+            self.redirect('/rewards/dashboard',
+                          headers={'Set-Cookie': f'{SESSION_COOKIE}={session_id}; Path=/; HttpOnly'})
+        elif url.path == '/offers/complete':
+            session_id = self.session_id()
+            if session_id:
+                self.state.complete_offer(session_id, parse_qs(url.query).get('offer', [''])[0])
+            self.send_body('{}', content_type='application/json; charset=utf-8')
+        else:
+            self.send_body('<html><body>Not found</body></html>', status=404)
+
+    @staticmethod
+    def dashboard(session):
+        card = Template(load_fixture('offer_card.html'))
+        offers = ''.join(
+            card.substitute(offer=offer, title=escape(title),
+                            icon='mee-icon-SkypeCircleCheck' if offer in session['offers'] else 'mee-icon-AddMedium')
+            for offer, title in OFFERS)
+        return Template(load_fixture('dashboard.html')).substitute(offers=offers)
+
+    @staticmethod
+    def search_results(term):
+        results = ''.join(f'<li class="b_algo"><h2><a href="#">{escape(term)} result {i}</a></h2></li>'
+                          for i in range(1, 4)) if term else ''
+        return Template(load_fixture('search.html')).substitute(query=escape(term, quote=True), results=results)
+
+    def flyout(self, session):
+        return Template(load_fixture('flyout.html')).substitute(
+            total=self.state.total(session),
+            pc=session['pc'], pc_max=SEARCH_POINT_CAPS['pc'],
+            mobile=session['mobile'], mobile_max=SEARCH_POINT_CAPS['mobile'])
+
+    @staticmethod
+    def daily_trends(date):
+        trends = json.loads(load_fixture('trends.json'))
+        # every day gets its own terms, like the live api
+        for search in trends['default']['trendingSearchesDays'][0]['trendingSearches']:
+            search['title']['query'] = f'{search["title"]["query"]} {date}'.strip()
+        trends['default']['trendingSearchesDays'][0]['date'] = date
+        return json.dumps(trends)
+
+
+class FixtureServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address):
+        super().__init__(server_address, FixtureHandler)
+        self.state = FixtureState()
+
+
+def start_server(port=0, host='127.0.0.1'):
+    """
+    Starts the fixture server on a daemon thread
+    :param port: Int port to listen on, 0 picks a free one
+    :param host: address to listen on
+    :return: tuple of the server obj and its base url, pass the url to ms_rewards.set_base_url()
+    """
+    server = FixtureServer((host, port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--port', default=8000, type=int, help='Port to listen on, default is 8000.')
+    arg_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on, default is 127.0.0.1.')
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s :: %(levelname)s :: %(message)s')
+    server = FixtureServer((args.host, args.port))
+    logging.info(msg=f'Serving fixtures on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
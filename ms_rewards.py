@@ -2,38 +2,75 @@
 # ms_rewards.py - Searches for results via pc bing browser and mobile, completes quizzes on pc bing browser
 # Version 2019.07.13
 
-# TODO replace sleeps with minimum sleeps for explicit waits to work, especially after a page redirect
 # FIXME mobile version does not require re-sign in, but pc version does, why?
 # FIXME Known Cosmetic Issue - logged point total caps out at the point cost of the item on wishlist
 
 import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import itertools
 import json
+import math
 import logging
+import multiprocessing.util
 import os
 import platform
 import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
 import time
 import zipfile
 import os
+from collections import Counter, deque
+from contextlib import closing, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 
 import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException, TimeoutException, \
     ElementClickInterceptedException, ElementNotVisibleException, \
-    ElementNotInteractableException, NoSuchElementException, UnexpectedAlertPresentException
+    ElementNotInteractableException, NoSuchElementException, UnexpectedAlertPresentException, \
+    StaleElementReferenceException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.command import Command
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.ui import WebDriverWait
+from urllib3.util.retry import Retry
 
-# URLs
+# URLs, set_base_url points them all at one local server, e.g. fixture_server.py
+LOGIN_URL = 'https://login.live.com/'
 BING_SEARCH_URL = 'https://www.bing.com/search'
 DASHBOARD_URL = 'https://account.microsoft.com/rewards/dashboard'
 POINT_TOTAL_URL = 'http://www.bing.com/rewardsapp/bepflyoutpage?style=chromeextension'
+TRENDS_URL = 'https://trends.google.com/trends/api/dailytrends'
+
+# countries to get google trends for, override with --trends-geo
+TRENDS_GEOS = ['US']
+# search terms from past days are kept in an sqlite store, and removed once older than SEARCH_TERM_MAX_AGE_DAYS
+SEARCH_TERMS_DB = 'search_terms.db'
+SEARCH_TERM_MAX_AGE_DAYS = 7
+# most search terms drawn from the store per search phase, searches stop earlier once points are maxed
+SEARCH_TERMS_PER_PHASE = {'mobile': 40, 'pc': 60}
+# points one search earns, used to predict the searches left until the earned rate is measured
+POINTS_PER_SEARCH = 5
+# seconds to wait for a connection or response from plain http requests
+HTTP_TIMEOUT = 10
+# http requests are retried this many times, with exponential backoff between tries
+HTTP_RETRIES = 3
 
 # user agents for edge/pc and mobile
 PC_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -42,9 +79,243 @@ PC_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
 MOBILE_USER_AGENT = ('Mozilla/5.0 (Windows Phone 10.0; Android 4.2.1; WebView/3.0) '
                      'AppleWebKit/537.36 (KHTML, like Gecko) coc_coc_browser/64.118.222 '
                      'Chrome/52.0.2743.116 Mobile Safari/537.36 Edge/15.15063')
+# ways to submit a search, see submit_search()
+SEARCH_METHODS = ['type', 'url', 'script']
+# fills in and submits the search form in one webdriver call, returns false if there is no search box
+_SUBMIT_SEARCH_SCRIPT = '''
+var box = document.getElementById('sb_form_q');
+if (!box || !box.form) { return false; }
+box.value = arguments[0];
+if (box.form.requestSubmit) { box.form.requestSubmit(); } else { box.form.submit(); }
+return true;
+'''
+
+# collects every offer card of the dashboard in one webdriver call, see get_offers()
+_GET_OFFERS_SCRIPT = '''
+var offers = [];
+document.querySelectorAll('div[class*="actionLink"] a').forEach(function (link) {
+    var card = link.closest('div[class*="actionLink"]').parentElement;
+    if (!card || !card.querySelector('span[class*="mee-icon-"]')) { return; }
+    var heading = card.querySelector('h3');
+    var title = (heading ? heading.innerText : link.innerText).trim();
+    var text = (title + ' ' + link.href).toLowerCase();
+    var hint = null;
+    if (text.indexOf('poll') !== -1) { hint = 'poll'; }
+    else if (text.indexOf('quiz') !== -1) { hint = 'quiz'; }
+    link.setAttribute('data-offer-index', offers.length);
+    offers.push({
+        index: offers.length,
+        href: link.href,
+        title: title,
+        type_hint: hint,
+        complete: !card.querySelector('span[class*="mee-icon-AddMedium"]')
+    });
+});
+return offers;
+'''
+# clicks an offer found by get_offers, by its href if the dashboard re-rendered since
+_CLICK_OFFER_SCRIPT = '''
+var href = arguments[1];
+var link = document.querySelector('a[data-offer-index="' + arguments[0] + '"]');
+if (!link || link.href !== href) {
+    link = null;
+    document.querySelectorAll('div[class*="actionLink"] a').forEach(function (candidate) {
+        if (!link && candidate.href === href) { link = candidate; }
+    });
+}
+if (!link) { return false; }
+link.click();
+return true;
+'''
+
+# returns the name of the first signature found on the page, else the resource count once the page has loaded
+_CLASSIFY_OFFER_SCRIPT = '''
+var signatures = arguments[0];
+for (var i = 0; i < signatures.length; i++) {
+    if (document.querySelector(signatures[i][1])) { return [signatures[i][0], 0]; }
+}
+return [null, document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1];
+'''
+# quiz progress signals, each returns whether the quiz is complete, the answer options of the
+# current question and a fingerprint of the question which changes once the next one renders
+_LIGHTNING_QUIZ_STATE_SCRIPT = '''
+var options = [];
+document.querySelectorAll('[id^="rqAnswerOption"]').forEach(function (option) {
+    if (/^rqAnswerOption[0-9]+$/.test(option.id)) { options.push(option.id); }
+});
+var counter = document.querySelector('#rqHeaderCredits');
+return {
+    complete: !!document.getElementById('quizCompleteContainer'),
+    options: options,
+    fingerprint: (counter ? counter.innerText : '') + '|' + options.map(function (id) {
+        return document.getElementById(id).innerText;
+    }).join('|')
+};
+'''
+_CLICK_QUIZ_STATE_SCRIPT = '''
+var popup = document.querySelector('.cico.btCloseBack');
+if (popup) { popup.click(); }
+var choices = Array.prototype.slice.call(document.querySelectorAll('.wk_Circle'));
+var question = document.querySelector('.wk_questionText');
+return {
+    complete: !!document.querySelector('span[class="rw_icon"]'),
+    options: choices.map(function (choice, index) { return index; }),
+    fingerprint: (question ? question.innerText : '') + '|' + choices.map(function (choice) {
+        return choice.parentElement.innerText;
+    }).join('|')
+};
+'''
+_DRAG_QUIZ_STATE_SCRIPT = '''
+var options = Array.prototype.map.call(document.querySelectorAll('.rqOption'), function (option) {
+    return {text: option.innerText.trim(), correct: option.classList.contains('correctAnswer')};
+});
+return {
+    complete: !!document.getElementById('quizCompleteContainer'),
+    options: options,
+    fingerprint: options.map(function (option) { return option.text + ':' + option.correct; }).join('|')
+};
+'''
+# most questions answered in one quiz
+QUIZ_MAX_ROUNDS = 10
+# most swaps in one drag and drop quiz, a question of n options is solved in at most n * n swaps
+DRAG_QUIZ_MAX_MOVES = 60
+
+# offer types identified today, keyed by offer url, see classify_offer()
+OFFER_TYPE_CACHE = 'offer_types.json'
+
 # log levels
 _LOG_LEVEL_STRINGS = ['CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG']
 
+# ceilings in seconds for each explicit wait step, a step only takes as long as the page needs
+# override per step with --wait-timeout STEP=SECONDS
+WAIT_TIMEOUTS = {
+    'default': 10,
+    'login_email': 10,
+    'login_password': 10,
+    'login_complete': 10,
+    'login_authenticator': 300,
+    'search_box': 15,
+    'search_results': 10,
+    'dashboard': 10,
+    'offer_window': 10,
+    'offer_load': 10,
+    'sign_in': 10,
+    'quiz_answer': 2,
+    'quiz_round': 10,
+    'point_total': 10,
+}
+# seconds between checks in wait_until_visible, the legacy version reloaded the page at every 2 second check
+VISIBLE_POLL_INTERVAL = 0.25
+LEGACY_VISIBLE_POLL_INTERVAL = 2
+
+# counters for the current run, logged when the run ends
+RUN_COUNTERS = Counter()
+
+# structured timing events, one json object per line in the log dir, see span()
+EVENTS_FILE = 'events.jsonl'
+_EVENTS_PATH = os.path.join('logs', EVENTS_FILE)
+# tags added to every event and metric, run_account sets the account and mode
+SPAN_TAGS = {'account': '', 'mode': ''}
+# RUN_COUNTERS each span records how much they grew while it ran, the first three are counted by
+# instrument_browser, the search ones by SearchProgress.log and the drag quiz ones by drag_and_drop_quiz
+SPAN_COUNTERS = ('webdriver_commands', 'page_loads', 'refreshes', 'search_queries', 'search_points',
+                 'drag_quizzes', 'drag_quiz_moves')
+# totals of the current account per (span, account, mode), see write_prometheus_textfile()
+_SPAN_TOTALS = {}
+
+# set by --profile, every browser from browser_setup then records its webdriver commands, see profile_browser()
+PROFILE_COMMANDS = False
+# (phase, caller stack, command) to [calls, seconds]
+_COMMAND_PROFILE = {}
+# wrapper frames left out of the caller stacks
+_PROFILE_SKIP_FRAMES = {'<module>', 'wrapper', 'counted_execute', 'profiled_execute', 'caller_stack'}
+
+# requests session shared by the http helpers of this process, see http_session()
+_HTTP_SESSION = None
+_HTTP_SESSION_PID = None
+
+# cached login cookies, one file per account, reused for at most SESSION_MAX_AGE_HOURS
+SESSION_DIR = 'sessions'
+SESSION_MAX_AGE_HOURS = 72
+# cookie fields accepted by the devtools Network.setCookies command
+_COOKIE_PARAM_KEYS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires')
+
+# user agent overrides set through devtools, keyed by webdriver session id
+_USER_AGENT_OVERRIDES = {}
+
+# directory for error screenshots, each account gets its own when running with --workers
+SCREENSHOT_DIR = 'logs'
+# phases each account finished today, one fsync'd jsonl file per day, see RunJournal
+JOURNAL_DIR = 'journal'
+MOBILE_PHASES = ['mobile_dailies', 'mobile_search']
+PC_PHASES = ['pc_search', 'dailies', 'email_links']
+# account jobs, see JobScheduler
+JOB_TIMEOUT_MINUTES = 30
+JOB_RETRIES = 2
+# first retry waits this long, each further retry twice as long
+RETRY_BACKOFF_SECONDS = 30
+# a --deadline more than this many hours before the start time is taken as after midnight
+DEADLINE_ROLLOVER_HOURS = 12
+# browsers open in this process and the deadline of the running job, see run_job()
+_ACTIVE_BROWSERS = set()
+_JOB_DEADLINE = None
+# first browser of a run, (user agent, future), started while the run inputs are fetched, see prefetch_run_inputs()
+_PRELAUNCHED_BROWSER = None
+# browser pool of this process, see browser_pool()
+_BROWSER_POOL = None
+_BROWSER_POOL_PID = None
+# estimated memory of one chrome instance, a worker only starts a browser when this much is available
+BROWSER_MEMORY_MB = 600
+# a browser started less than this many seconds ago may not show up in available memory yet
+BROWSER_WARMUP_SECONDS = 20
+# chrome launch profiles for browser_setup, lean skips images, media, fonts and background services
+# to start faster and use less memory per browser, see benchmarks/browser_startup.py
+LAUNCH_PROFILES = {
+    'full': {
+        'arguments': [],
+        'prefs': {},
+        'w3c': False,
+        'blocked_urls': [],
+    },
+    'lean': {
+        'arguments': ['--disable-gpu', '--disable-background-networking', '--disable-component-update',
+                      '--disable-default-apps', '--disable-sync', '--mute-audio', '--no-first-run',
+                      '--blink-settings=imagesEnabled=false', '--window-size=1024,768'],
+        'prefs': {'profile.managed_default_content_settings.images': 2},
+        'w3c': True,
+        'blocked_urls': ['*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.woff', '*.woff2', '*.ttf', '*.otf'],
+    },
+}
+
+# chromedriver cache, one sub directory per chrome build, see chromedriver_path()
+DRIVER_DIR = 'drivers'
+CHROMEDRIVER_URL = 'https://chromedriver.storage.googleapis.com'
+CHROMEDRIVER_ZIPS = {'Windows': 'chromedriver_win32.zip', 'Darwin': 'chromedriver_mac64.zip',
+                     'Linux': 'chromedriver_linux64.zip'}
+# commands that print the installed chrome version, tried in order
+CHROME_VERSION_COMMANDS = {
+    'Darwin': [['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome', '--version']],
+    'Linux': [['google-chrome', '--version'], ['google-chrome-stable', '--version'],
+              ['chromium-browser', '--version'], ['chromium', '--version']],
+}
+# a driver download lock older than this is left over from a crashed process
+DRIVER_LOCK_STALE_SECONDS = 300
+
+
+def set_base_url(base_url):
+    """
+    Points every service url at base_url, for running against a local stand-in such as fixture_server.py
+    :param base_url: String, e.g. http://127.0.0.1:8000
+    :return: None
+    """
+    global LOGIN_URL, BING_SEARCH_URL, DASHBOARD_URL, POINT_TOTAL_URL, TRENDS_URL
+    base_url = base_url.rstrip('/')
+    LOGIN_URL = f'{base_url}/login'
+    BING_SEARCH_URL = f'{base_url}/search'
+    DASHBOARD_URL = f'{base_url}/rewards/dashboard'
+    POINT_TOTAL_URL = f'{base_url}/rewardsapp/bepflyoutpage?style=chromeextension'
+    TRENDS_URL = f'{base_url}/trends/api/dailytrends'
+
 
 def check_python_version():
     """
@@ -55,12 +326,6 @@ def check_python_version():
         message = 'Only Python %s.%s and above is supported.' % minimum_version
         raise Exception(message)
 
-def update_driver():
-    '''
-    Auto deletes Chrome driver to ensure no errors - this forces an autoupdate of chrome drivers. There is probably a more efficient way of doing this.
-    '''
-    os.remove("drivers/chromedriver.exe")
-
 def _log_level_string_to_int(log_level_string):
     log_level_string = log_level_string.upper()
 
@@ -74,15 +339,202 @@ def _log_level_string_to_int(log_level_string):
     return log_level_int
 
 
-def init_logging(log_level):
+def _wait_timeout_string_to_pair(wait_timeout_string):
+    step, _, seconds = wait_timeout_string.partition('=')
+    if step not in WAIT_TIMEOUTS:
+        message = f'invalid step: {step} (choose from {sorted(WAIT_TIMEOUTS)})'
+        raise argparse.ArgumentTypeError(message)
+    try:
+        return step, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid seconds for {step}: {seconds}')
+
+
+def _deadline_string_to_timestamp(deadline_string):
+    try:
+        deadline = datetime.combine(datetime.now().date(), datetime.strptime(deadline_string, '%H:%M').time())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid deadline: {deadline_string} (use HH:MM)')
+    # a time long passed today is tomorrow, e.g. a run starting before and ending after midnight,
+    # a time passed a little while ago is a late start, the run stops straight away
+    if deadline <= datetime.now() - timedelta(hours=DEADLINE_ROLLOVER_HOURS):
+        deadline += timedelta(days=1)
+    return deadline.timestamp()
+
+
+def init_logging(log_level, log_dir='logs'):
+    global _EVENTS_PATH
     # gets dir path of python script, not cwd, for execution on cron
     os.chdir(os.path.dirname(os.path.realpath(__file__)))
-    os.makedirs('logs', exist_ok=True)
-    log_path = os.path.join('logs', 'ms_rewards.log')
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, 'ms_rewards.log')
+    # worker processes re-init logging for every account they run
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
     logging.basicConfig(
         filename=log_path,
         level=log_level,
         format='%(asctime)s :: %(levelname)s :: %(name)s :: %(message)s')
+    _EVENTS_PATH = os.path.join(log_dir, EVENTS_FILE)
+
+
+def record_event(event):
+    """
+    Appends one event, tagged with SPAN_TAGS, to the events file of the current log dir
+    :param event: json serializable dict
+    :return: None
+    """
+    line = json.dumps(dict(SPAN_TAGS, time=round(time.time(), 3), pid=os.getpid(), **event))
+    try:
+        with open(_EVENTS_PATH, 'a') as f:
+            f.write(line + '\n')
+    except OSError:
+        logging.debug(msg='Event not recorded.', exc_info=True)
+
+
+@contextmanager
+def span(name):
+    """
+    Times a block and records it as an event, with how much each of the SPAN_COUNTERS grew while it ran
+    Spans nest, the counts of a span include those of the spans inside it
+    :param name: String span name
+    :return: context manager
+    """
+    start_counts = [RUN_COUNTERS[counter] for counter in SPAN_COUNTERS]
+    start_time = time.time()
+    status = 'error'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        duration = time.time() - start_time
+        counts = {counter: RUN_COUNTERS[counter] - start_count
+                  for counter, start_count in zip(SPAN_COUNTERS, start_counts)}
+        record_event(dict(span=name, status=status, duration_ms=round(duration * 1000, 1), **counts))
+        totals = _SPAN_TOTALS.setdefault((name, SPAN_TAGS['account'], SPAN_TAGS['mode']), Counter())
+        totals.update(counts, count=1, seconds=duration, errors=int(status != 'ok'))
+
+
+def timed_span(func):
+    """
+    Decorator, runs every call of func in a span named after it
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def instrument_browser(browser):
+    """
+    Wraps the webdriver so every command sent to chromedriver, page load and refresh is counted in RUN_COUNTERS
+    :param browser: webdriver obj
+    :return: the same webdriver obj
+    """
+    execute = browser.execute
+
+    def counted_execute(driver_command, params=None):
+        RUN_COUNTERS['webdriver_commands'] += 1
+        if driver_command == Command.GET:
+            RUN_COUNTERS['page_loads'] += 1
+        elif driver_command == Command.REFRESH:
+            RUN_COUNTERS['refreshes'] += 1
+        return execute(driver_command, params)
+
+    browser.execute = counted_execute
+    return browser
+
+
+def write_prometheus_textfile(directory):
+    """
+    Writes the span totals of the current account for the node exporter textfile collector
+    One file per account, swapped in atomically so the collector never reads a partial file
+    :param directory: String textfile collector directory
+    :return: None
+    """
+    metrics = [
+        ('seconds', 'ms_rewards_span_seconds', 'Seconds spent in each span in the last run'),
+        ('count', 'ms_rewards_span_calls', 'Calls of each span in the last run'),
+        ('errors', 'ms_rewards_span_errors', 'Calls of each span that raised in the last run'),
+        ('webdriver_commands', 'ms_rewards_span_webdriver_commands', 'WebDriver commands sent in each span'),
+        ('page_loads', 'ms_rewards_span_page_loads', 'Pages loaded in each span'),
+        ('refreshes', 'ms_rewards_span_refreshes', 'Pages refreshed in each span'),
+        ('search_queries', 'ms_rewards_span_search_queries', 'Searches submitted in each span'),
+        ('search_points', 'ms_rewards_span_search_points', 'Search points earned in each span'),
+        ('drag_quizzes', 'ms_rewards_span_drag_quizzes', 'Drag and drop quizzes solved in each span'),
+        ('drag_quiz_moves', 'ms_rewards_span_drag_quiz_moves', 'Drag and drop moves made in each span'),
+    ]
+    lines = []
+    for key, metric, description in metrics:
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} gauge']
+        for (name, account, mode), totals in sorted(_SPAN_TOTALS.items()):
+            lines.append(f'{metric}{{span="{name}",account="{account}",mode="{mode}"}} {totals[key]:g}')
+    lines += ['# HELP ms_rewards_last_run_timestamp_seconds When the last run of the account ended',
+              '# TYPE ms_rewards_last_run_timestamp_seconds gauge',
+              f'ms_rewards_last_run_timestamp_seconds{{account="{SPAN_TAGS["account"]}"}} {time.time():.0f}']
+    write_file_atomic(os.path.join(directory, f'ms_rewards_{SPAN_TAGS["account"]}.prom'), '\n'.join(lines) + '\n')
+
+
+def caller_stack():
+    """
+    Names of the functions of this module on the current call stack, outermost first
+    :return: String of function names joined by ;
+    """
+    names = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == __file__ and code.co_name not in _PROFILE_SKIP_FRAMES:
+            names.append(code.co_name)
+        frame = frame.f_back
+    return ';'.join(reversed(names)) or 'unknown'
+
+
+def profile_browser(browser):
+    """
+    Wraps the command executor of the webdriver, every command is recorded with its caller stack and latency
+    :param browser: webdriver obj
+    :return: the same webdriver obj
+    """
+    execute = browser.command_executor.execute
+
+    def profiled_execute(command, params):
+        stack = caller_stack()
+        start_time = time.perf_counter()
+        try:
+            return execute(command, params)
+        finally:
+            entry = _COMMAND_PROFILE.setdefault((SPAN_TAGS['mode'] or 'setup', stack, command), [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start_time
+
+    browser.command_executor.execute = profiled_execute
+    return browser
+
+
+def write_command_profile(directory, top=10):
+    """
+    Writes the recorded webdriver commands of each phase in folded stack format, one
+    profile_<phase>.folded file per phase weighted by microseconds, for flamegraph.pl or speedscope
+    Logs the commands per phase and the caller stacks that sent the most of them
+    :param directory: String
+    :param top: Int number of caller stacks logged per phase
+    :return: None
+    """
+    phases = {}
+    for (phase, stack, command), (calls, seconds) in _COMMAND_PROFILE.items():
+        phases.setdefault(phase, []).append((calls, seconds, f'{stack};{command}'))
+    for phase, entries in sorted(phases.items()):
+        entries.sort(reverse=True)
+        write_file_atomic(os.path.join(directory, f'profile_{phase}.folded'),
+                          ''.join(f'{frames} {round(seconds * 1e6)}\n' for _, seconds, frames in entries))
+        logging.info(msg=f'Profile {phase}: {sum(entry[0] for entry in entries)} webdriver commands in '
+                         f'{sum(entry[1] for entry in entries):.1f} seconds')
+        for calls, seconds, frames in entries[:top]:
+            logging.info(msg=f'    {calls:>5} calls {seconds:>7.2f}s  {frames}')
 
 
 def parse_args():
@@ -139,6 +591,117 @@ def parse_args():
         dest='log_level',
         type=_log_level_string_to_int,
         help=f'Set the logging output level. {_LOG_LEVEL_STRINGS}')
+    arg_parser.add_argument(
+        '--wait-timeout',
+        action='append',
+        default=[],
+        dest='wait_timeouts',
+        metavar='STEP=SECONDS',
+        type=_wait_timeout_string_to_pair,
+        help=f'Override the ceiling of an explicit wait step, can be repeated. {sorted(WAIT_TIMEOUTS)}')
+    arg_parser.add_argument(
+        '--workers',
+        default=1,
+        dest='workers',
+        type=int,
+        help='Number of accounts to run at the same time, each in its own process, default is 1.')
+    arg_parser.add_argument(
+        '--worker-memory',
+        default=BROWSER_MEMORY_MB,
+        dest='worker_memory',
+        type=int,
+        help=f'MB of free memory needed before another worker starts a browser, default is {BROWSER_MEMORY_MB}.')
+    arg_parser.add_argument(
+        '--deadline',
+        dest='deadline',
+        type=_deadline_string_to_timestamp,
+        help='Local time HH:MM by which the run stops, no account starts after it and running ones are stopped.')
+    arg_parser.add_argument(
+        '--job-timeout',
+        default=JOB_TIMEOUT_MINUTES,
+        dest='job_timeout',
+        type=float,
+        help=f'Minutes one account may run before its browser is quit, default is {JOB_TIMEOUT_MINUTES}.')
+    arg_parser.add_argument(
+        '--retries',
+        default=JOB_RETRIES,
+        dest='retries',
+        type=int,
+        help=f'Times an unfinished account is run again, with growing waits between tries, default is {JOB_RETRIES}.')
+    arg_parser.add_argument(
+        '--single-browser',
+        action='store_true',
+        dest='single_browser',
+        default=False,
+        help='Use one browser and one login per account, switching user agent between mobile and pc, default is off.')
+    arg_parser.add_argument(
+        '--session-cache',
+        action='store_true',
+        dest='session_cache',
+        default=False,
+        help=f'Save login cookies in {SESSION_DIR}/ and reuse them instead of logging in, default is off.')
+    arg_parser.add_argument(
+        '--trends-geo',
+        action='append',
+        dest='trends_geos',
+        metavar='GEO',
+        help=f'Country code to get google trends search terms for, can be repeated, default is {TRENDS_GEOS}.')
+    arg_parser.add_argument(
+        '--search-method',
+        choices=SEARCH_METHODS,
+        default='type',
+        dest='search_method',
+        help='How searches are submitted: type into the search box, go to the results url, '
+             'or submit the search form with one script call. Default is type.')
+    arg_parser.add_argument(
+        '--tabs',
+        default=1,
+        dest='tabs',
+        type=int,
+        help='Number of daily offers opened at the same time in separate tabs, default is 1.')
+    arg_parser.add_argument(
+        '--base-url',
+        dest='base_url',
+        help='Send all login, search, rewards and trends requests to this server instead, '
+             'e.g. http://127.0.0.1:8000 for fixture_server.py.')
+    arg_parser.add_argument(
+        '--reddit-links',
+        action='store_true',
+        dest='reddit_links',
+        default=False,
+        help='With --email, refreshes email_links.txt from the reddit feed first, like redditScrape.py.')
+    arg_parser.add_argument(
+        '--no-resume',
+        action='store_true',
+        dest='no_resume',
+        default=False,
+        help='Runs every phase again, even those the journal records as finished today.')
+    arg_parser.add_argument(
+        '--warm-pool',
+        default=0,
+        dest='warm_pool',
+        type=int,
+        help='Keeps up to N browsers started in the background and reuses them between accounts, '
+             'default is 0, a new browser for every phase.')
+    arg_parser.add_argument(
+        '--launch-profile',
+        default='full',
+        dest='launch_profile',
+        choices=sorted(LAUNCH_PROFILES),
+        help='Chrome launch profile, lean blocks images, media and fonts and turns off background services '
+             'and the gpu to save startup time and memory. Default is full.')
+    arg_parser.add_argument(
+        '--profile',
+        action='store_true',
+        dest='profile',
+        default=False,
+        help='Records every webdriver command with its caller and latency, writes a folded stack '
+             'profile per phase to the log dir at exit.')
+    arg_parser.add_argument(
+        '--prometheus-dir',
+        dest='prometheus_dir',
+        help='Writes the span timings of each account to a .prom file in this node exporter '
+             'textfile collector directory.')
     _parser = arg_parser.parse_args()
     if _parser.all_mode:
         _parser.mobile_mode = True
@@ -146,9 +709,28 @@ def parse_args():
         _parser.quiz_mode = True
     if _parser.use_authenticator:
         _parser.headless_setting = False
+    apply_args(_parser)
     return _parser
 
 
+def apply_args(args):
+    """
+    Sets the module settings the arguments change, called again in worker processes,
+    spawned workers (windows, macos) do not inherit them from the main process
+    :param args: argparse object
+    :return: None
+    """
+    WAIT_TIMEOUTS.update(args.wait_timeouts)
+    if args.base_url:
+        set_base_url(args.base_url)
+    set_profiling(args.profile)
+
+
+def set_profiling(enabled):
+    global PROFILE_COMMANDS
+    PROFILE_COMMANDS = enabled
+
+
 def get_dates(days_to_get=4):
     """
     Returns a list of dates from today to 3 days ago in year, month, day format
@@ -164,58 +746,214 @@ def get_dates(days_to_get=4):
     return dates
 
 
-def get_search_terms():
-    def get_cached_search_terms(file_name):
-        if not os.path.exists(file_name):
-            return []
+def new_http_session():
+    """
+    Creates a requests session with a keep-alive connection pool and retries with backoff
+    :return: requests.Session obj
+    """
+    retry = Retry(total=HTTP_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def http_session():
+    """
+    Returns the requests session shared by this process, for requests without account cookies
+    :return: requests.Session obj
+    """
+    global _HTTP_SESSION, _HTTP_SESSION_PID
+    # pooled connections must not be shared with forked worker processes
+    if _HTTP_SESSION is None or _HTTP_SESSION_PID != os.getpid():
+        _HTTP_SESSION = new_http_session()
+        _HTTP_SESSION_PID = os.getpid()
+    return _HTTP_SESSION
 
-        with open(file_name, 'r') as f:
-            data = json.load(f)
 
-        if data['date_cached'] != datetime.now().strftime("%Y%m%d"):
-            return []
-        search_terms = data['terms']
-        return search_terms
+def get_daily_trends(date, geo):
+    """
+    Gets the google trends daily top searches of one date and country
+    :param date: string date in year, month, day format
+    :param geo: string country code
+    :return: parsed json dict, None if the request failed
+    """
+    try:
+        request = http_session().get(
+            TRENDS_URL, params={'hl': 'en-US', 'ed': date, 'geo': geo, 'ns': 15}, timeout=HTTP_TIMEOUT)
+        request.raise_for_status()
+        # response starts with )]}', to prevent json hijacking
+        return json.loads(request.text[5:])
+    except RequestException:
+        logging.error(f'Error retrieving google trends json for {date} {geo}.')
+    except ValueError:
+        logging.error(f'Cannot parse google trends json for {date} {geo}.')
+    return None
 
-    def cache_search_terms(file_name, search_terms):
-        data = {}
-        data['date_cached'] = datetime.now().strftime("%Y%m%d")
-        data['terms'] = search_terms
-        with open(file_name, 'w') as file:
-            json.dump(data, file)
 
-    def add_new_search_term(existing_terms, new_term):
-        if new_term not in existing_terms:
-            existing_terms.append(new_term)
+def iter_daily_trends(dates, geos):
+    """
+    Gets google trends for every date and country at the same time, yields each response as it arrives
+    :param dates: list of string dates in year, month, day format
+    :param geos: list of string country codes
+    :return: generator of (date, geo, parsed json dict) tuples
+    """
+    jobs = [(date, geo) for date in dates for geo in geos]
+    if not jobs:
+        return
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {executor.submit(get_daily_trends, date, geo): (date, geo) for date, geo in jobs}
+        for future in as_completed(futures):
+            response = future.result()
+            if response is not None:
+                date, geo = futures[future]
+                yield date, geo, response
+
+
+def iter_trend_terms(response):
+    """
+    Yields the lower case trending searches and their related queries of a google trends response
+    :param response: parsed json dict
+    :return: generator of strings
+    """
+    try:
+        for topic in response['default']['trendingSearchesDays'][0]['trendingSearches']:
+            yield topic['title']['query'].lower()
+            for related_topic in topic['relatedQueries']:
+                yield related_topic['query'].lower()
+    except (KeyError, IndexError):
+        logging.error('Cannot parse, JSON keys are modified.')
 
-    dates = get_dates()
-    local_file = 'search_terms.json'
 
-    search_terms = get_cached_search_terms(local_file)
-    if len(search_terms):
-        return list(set(search_terms))
+def open_term_store(db_path=SEARCH_TERMS_DB):
+    """
+    Opens the search term store, safe to use from several worker processes at the same time
+    :param db_path: path of the sqlite file
+    :return: sqlite3 connection
+    """
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    # write ahead log lets workers read while another process records term uses
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS terms ('
+        'term TEXT PRIMARY KEY, trend_date TEXT NOT NULL, uses INTEGER NOT NULL DEFAULT 0, last_used REAL)')
+    connection.execute('CREATE INDEX IF NOT EXISTS terms_uses ON terms (uses)')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS fetched (trend_date TEXT NOT NULL, geo TEXT NOT NULL, PRIMARY KEY (trend_date, geo))')
+    return connection
+
+
+def store_terms(term_store, date, geo, terms):
+    """
+    Adds the terms of one trends day to the store, existing terms keep their use count
+    :param term_store: sqlite3 connection
+    :param date: string date in year, month, day format
+    :param geo: string country code
+    :param terms: iterable of strings
+    :return: None
+    """
+    rows = [(term, date) for term in set(terms)]
+    with term_store:
+        term_store.execute('BEGIN')
+        term_store.executemany('INSERT OR IGNORE INTO terms (term, trend_date) VALUES (?, ?)', rows)
+        # a term trending again keeps the newest date so it is not expired early
+        term_store.executemany(
+            'UPDATE terms SET trend_date = ?2 WHERE term = ?1 AND trend_date < ?2', rows)
+        # today is still trending, it is fetched again on the next run, so is a day that gave no terms,
+        # e.g. a response iter_trend_terms could not parse
+        if rows and date != datetime.now().strftime('%Y%m%d'):
+            term_store.execute('INSERT OR IGNORE INTO fetched (trend_date, geo) VALUES (?, ?)', (date, geo))
+
+
+def expire_terms(term_store, max_age_days=SEARCH_TERM_MAX_AGE_DAYS):
+    """
+    Removes terms and fetched days older than max_age_days
+    :param term_store: sqlite3 connection
+    :param max_age_days: Int
+    :return: None
+    """
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y%m%d')
+    with term_store:
+        term_store.execute('BEGIN')
+        term_store.execute('DELETE FROM terms WHERE trend_date < ?', (cutoff,))
+        term_store.execute('DELETE FROM fetched WHERE trend_date < ?', (cutoff,))
 
-    for date in dates:
-        try:
-            # get URL, get api response and parse with json
-            url = f'https://trends.google.com/trends/api/dailytrends?hl=en-US&ed={date}&geo=US&ns=15'
-            request = requests.get(url)
-            response = json.loads(request.text[5:])
-            # get all trending searches with their related queries
-            for topic in response['default']['trendingSearchesDays'][0]['trendingSearches']:
-                add_new_search_term(search_terms, topic['title']['query'].lower())
-                for related_topic in topic['relatedQueries']:
-                    add_new_search_term(search_terms, related_topic['query'].lower())
-            time.sleep(random.randint(3, 5))
-        except RequestException:
-            logging.error('Error retrieving google trends json.')
-        except KeyError:
-            logging.error('Cannot parse, JSON keys are modified.')
-    # get unique terms and return a list
-    logging.info(msg=f'# of search items: {len(search_terms)}\n')
-
-    cache_search_terms(local_file, search_terms)
-    return list(set(search_terms))
+
+def sample_terms(term_store, k, exclude=None, seed=None):
+    """
+    Lazily draws up to k distinct terms, least used first, without loading or shuffling the whole store
+    Rows are picked by random rowid, so each draw is one primary key lookup
+    :param term_store: sqlite3 connection
+    :param k: Int number of terms
+    :param exclude: set of terms not to draw, drawn terms are added to it, pass the same set to
+        the mobile and pc phases of an account so they do not repeat terms
+    :param seed: random seed for a reproducible order
+    :return: generator of strings
+    """
+    exclude = set() if exclude is None else exclude
+    rng = random.Random(seed)
+    low, high, max_uses = term_store.execute('SELECT MIN(rowid), MAX(rowid), MIN(uses) FROM terms').fetchone()
+    if low is None:
+        return
+    rowid_range = high - low + 1
+    # rowids already drawn or empty, and rowids skipped because they are used more than max_uses
+    seen = set()
+    stale = set()
+    misses = 0
+    drawn = 0
+    while drawn < k and len(seen) < rowid_range:
+        rowid = rng.randint(low, high)
+        if rowid in seen or rowid in stale:
+            misses += 1
+            # the freshest terms are (nearly) used up, allow terms used once more
+            if misses >= rowid_range:
+                max_uses += 1
+                stale.clear()
+                misses = 0
+            continue
+        row = term_store.execute('SELECT term, uses FROM terms WHERE rowid = ?', (rowid,)).fetchone()
+        if row is not None and row[1] > max_uses:
+            stale.add(rowid)
+            continue
+        seen.add(rowid)
+        misses = 0
+        if row is None or row[0] in exclude:
+            continue
+        exclude.add(row[0])
+        drawn += 1
+        yield row[0]
+
+
+def record_term_use(term_store, term):
+    """
+    Counts a search with term, so it is picked last next time
+    :param term_store: sqlite3 connection
+    :param term: String
+    :return: None
+    """
+    term_store.execute('UPDATE terms SET uses = uses + 1, last_used = ? WHERE term = ?', (time.time(), term))
+
+
+def get_search_terms(geos=None, db_path=SEARCH_TERMS_DB):
+    """
+    Updates the search term store with google trends days it does not have yet
+    :param geos: list of string country codes, default TRENDS_GEOS
+    :param db_path: path of the sqlite file
+    :return: path of the sqlite file
+    """
+    geos = geos or TRENDS_GEOS
+    with closing(open_term_store(db_path)) as term_store:
+        expire_terms(term_store)
+        fetched = set(term_store.execute('SELECT trend_date, geo FROM fetched'))
+        dates = [date for date in get_dates() if any((date, geo) not in fetched for geo in geos)]
+        missing_geos = [geo for geo in geos if any((date, geo) not in fetched for date in dates)]
+        for date, geo, response in iter_daily_trends(dates, missing_geos):
+            if (date, geo) not in fetched:
+                store_terms(term_store, date, geo, iter_trend_terms(response))
+        term_count = term_store.execute('SELECT COUNT(*) FROM terms').fetchone()[0]
+    logging.info(msg=f'# of search items: {term_count}\n')
+    return db_path
 
 
 def get_login_info():
@@ -227,53 +965,154 @@ def get_login_info():
         return json.load(f)
 
 
-def download_driver(driver_path, system):
-    # determine latest chromedriver version
-    url = "https://chromedriver.storage.googleapis.com/LATEST_RELEASE"
-    r = requests.get(url)
-    latest_version = r.text
-    if system == "Windows":
-        url = "https://chromedriver.storage.googleapis.com/{}/chromedriver_win32.zip".format(latest_version)
-    elif system == "Darwin":
-        url = "https://chromedriver.storage.googleapis.com/{}/chromedriver_mac64.zip".format(latest_version)
-    elif system == "Linux":
-        url = "https://chromedriver.storage.googleapis.com/{}/chromedriver_linux64.zip".format(latest_version)
-
-    response = requests.get(url, stream=True)
-    zip_file_path = os.path.join(os.path.dirname(driver_path), os.path.basename(url))
-    with open(zip_file_path, "wb") as handle:
-        for chunk in response.iter_content(chunk_size=512):
-            if chunk:  # filter out keep alive chunks
-                handle.write(chunk)
-    extracted_dir = os.path.splitext(zip_file_path)[0]
-    with zipfile.ZipFile(zip_file_path, "r") as zip_file:
-        zip_file.extractall(extracted_dir)
-    os.remove(zip_file_path)
+def chrome_version(system):
+    """
+    Finds the version of the installed chrome
+    :param system: String platform.system() name
+    :return: String version, e.g. 77.0.3865.120, None if chrome was not found
+    """
+    if system == 'Windows':
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r'Software\Google\Chrome\BLBeacon') as key:
+                output = winreg.QueryValueEx(key, 'version')[0]
+        except OSError:
+            return None
+    else:
+        output = ''
+        for command in CHROME_VERSION_COMMANDS.get(system, []):
+            try:
+                output = subprocess.check_output(command, stderr=subprocess.DEVNULL, timeout=10).decode()
+                break
+            except (OSError, subprocess.SubprocessError):
+                continue
+    match = re.search(r'\d+\.\d+\.\d+\.\d+', output)
+    return match.group(0) if match else None
 
-    driver = os.listdir(extracted_dir)[0]
-    os.rename(os.path.join(extracted_dir, driver), driver_path)
-    os.rmdir(extracted_dir)
 
-    os.chmod(driver_path, 0o755)
+@contextmanager
+def driver_lock(timeout=DRIVER_LOCK_STALE_SECONDS):
+    """
+    Lock file in DRIVER_DIR, so only one worker process downloads a driver at a time
+    :param timeout: Int seconds after which a lock is treated as left over from a crashed process
+    :return: context manager
+    """
+    lock_path = os.path.join(DRIVER_DIR, '.lock')
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > timeout:
+                    logging.warning(msg='Removing stale chromedriver lock.')
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.5)
+    try:
+        yield
+    finally:
+        os.remove(lock_path)
+
+
+def download_driver(driver_path, system, chrome_build=None):
+    """
+    Downloads the chromedriver matching a chrome build and swaps it in at driver_path
+    The download is checked against the md5 google storage sends and the crc of every zip entry
+    :param driver_path: String path the driver is installed at
+    :param system: String platform.system() name
+    :param chrome_build: String first three parts of the chrome version, None for the latest driver
+    :return: None
+    """
+    # determine the chromedriver version for this chrome build
+    release_url = f'{CHROMEDRIVER_URL}/LATEST_RELEASE' + (f'_{chrome_build}' if chrome_build else '')
+    response = http_session().get(release_url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    driver_version = response.text.strip()
+
+    url = f'{CHROMEDRIVER_URL}/{driver_version}/{CHROMEDRIVER_ZIPS[system]}'
+    directory = os.path.dirname(driver_path)
+    os.makedirs(directory, exist_ok=True)
+    zip_descriptor, zip_path = tempfile.mkstemp(dir=directory, suffix='.zip')
+    driver_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(driver_descriptor)
+    try:
+        md5 = hashlib.md5()
+        with closing(http_session().get(url, stream=True, timeout=HTTP_TIMEOUT)) as response, \
+                os.fdopen(zip_descriptor, 'wb') as handle:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                md5.update(chunk)
+                handle.write(chunk)
+            # x-goog-hash: crc32c=..., md5=<base64 digest>
+            goog_hash = response.headers.get('x-goog-hash', '')
+            expected_md5 = dict(part.strip().split('=', 1) for part in goog_hash.split(',') if '=' in part).get('md5')
+        if expected_md5 and base64.b64decode(expected_md5) != md5.digest():
+            raise IOError(f'Checksum mismatch for {url}')
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            bad_entry = zip_file.testzip()
+            if bad_entry is not None:
+                raise IOError(f'Corrupt entry {bad_entry} in {url}')
+            driver_name = next(name for name in zip_file.namelist() if not name.endswith('/'))
+            with zip_file.open(driver_name) as source, open(temp_path, 'wb') as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                target.flush()
+                os.fsync(target.fileno())
+        os.chmod(temp_path, 0o755)
+        os.replace(temp_path, driver_path)
+    finally:
+        for path in (zip_path, temp_path):
+            if os.path.exists(path):
+                os.remove(path)
     # way to note which chromedriver version is installed
-    open(os.path.join(os.path.dirname(driver_path), "{}.txt".format(latest_version)), "w").close()
+    open(os.path.join(directory, f'{driver_version}.txt'), 'w').close()
+    logging.info(msg=f'Installed chromedriver {driver_version} for chrome {chrome_build or "latest"}.')
 
 
-def browser_setup(headless_mode, user_agent):
+def chromedriver_path():
+    """
+    Returns the chromedriver for the installed chrome, from the cache in DRIVER_DIR
+    A driver is only downloaded when chrome was updated to a build with no cached driver yet
+    :return: String path
+    """
+    system = platform.system()
+    driver_name = 'chromedriver.exe' if system == 'Windows' else 'chromedriver'
+    version = chrome_version(system)
+    # drivers match chrome by the first three parts of the version
+    chrome_build = version.rsplit('.', 1)[0] if version else None
+    driver_path = os.path.join(DRIVER_DIR, chrome_build or 'latest', driver_name)
+    if os.path.exists(driver_path):
+        return driver_path
+    if chrome_build is None:
+        # chrome version unknown, keep using a driver installed before the cache existed
+        legacy_path = os.path.join(DRIVER_DIR, driver_name)
+        if os.path.exists(legacy_path):
+            return legacy_path
+    os.makedirs(DRIVER_DIR, exist_ok=True)
+    with driver_lock():
+        # another worker may have installed it while this one waited for the lock
+        if not os.path.exists(driver_path):
+            download_driver(driver_path, system, chrome_build)
+    return driver_path
+
+
+@timed_span
+def browser_setup(headless_mode, user_agent, launch_profile='full'):
     """
     Inits the chrome browser with headless setting and user agent
     :param headless_mode: Boolean
     :param user_agent: String
+    :param launch_profile: name of one of LAUNCH_PROFILES
     :return: webdriver obj
     """
-    os.makedirs('drivers', exist_ok=True)
-    path = os.path.join('drivers', 'chromedriver')
-    system = platform.system()
-    if system == "Windows":
-        if not path.endswith(".exe"):
-            path += ".exe"
-    if not os.path.exists(path):
-        download_driver(path, system)
+    path = chromedriver_path()
+    profile = LAUNCH_PROFILES[launch_profile]
 
     options = Options()
     options.add_argument(f'user-agent={user_agent}')
@@ -281,11 +1120,15 @@ def browser_setup(headless_mode, user_agent):
     options.add_argument('--no-sandbox')
     options.add_argument("--disable-extensions")
     options.add_argument('--disable-dev-shm-usage')
-    options.add_experimental_option('w3c', False)
+    for argument in profile['arguments']:
+        options.add_argument(argument)
+    if not profile['w3c']:
+        options.add_experimental_option('w3c', False)
 
     prefs = {
         "profile.default_content_setting_values.geolocation" : 2, "profile.default_content_setting_values.notifications": 2
         }
+    prefs.update(profile['prefs'])
 
     options.add_experimental_option("prefs", prefs)
 
@@ -293,71 +1136,235 @@ def browser_setup(headless_mode, user_agent):
         options.add_argument('--headless')
 
     chrome_obj = webdriver.Chrome(path, options=options)
+    if PROFILE_COMMANDS:
+        profile_browser(chrome_obj)
+    if profile['blocked_urls']:
+        # only applies to the first window, offer windows are short lived and still skip images through prefs
+        chrome_obj.execute_cdp_cmd('Network.enable', {})
+        chrome_obj.execute_cdp_cmd('Network.setBlockedURLs', {'urls': profile['blocked_urls']})
+
+    return instrument_browser(chrome_obj)
 
-    return chrome_obj
+
+def set_user_agent(browser, user_agent):
+    """
+    Switches the user agent of a running browser through a devtools network override
+    Windows opened later get the override through sync_user_agent when they are switched to
+    :param browser: webdriver obj
+    :param user_agent: String
+    :return: None
+    """
+    browser.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': user_agent})
+    _USER_AGENT_OVERRIDES[browser.session_id] = user_agent
+    logging.debug(msg=f'User agent switched to {user_agent}')
 
 
-def log_in(email_address, pass_word):
+@timed_span
+def log_in(browser, email_address, pass_word, use_authenticator=False):
+    """
+    Signs in to the microsoft account
+    :param browser: webdriver obj
+    :param email_address: String
+    :param pass_word: String, ignored when use_authenticator is set
+    :param use_authenticator: Boolean, wait for an MS Authenticator approval instead of sending a password
+    :return: None
+    """
     logging.info(msg=f'Logging in {email_address}...')
-    browser.get('https://login.live.com/')
-    time.sleep(0.5)
+    browser.get(LOGIN_URL)
     # wait for login form and enter email
-    wait_until_clickable(By.NAME, 'loginfmt', 10)
-    send_key_by_name('loginfmt', email_address)
-    time.sleep(0.5)
-    send_key_by_name('loginfmt', Keys.RETURN)
+    wait_until_clickable(browser, By.NAME, 'loginfmt', wait_timeout('login_email'))
+    send_key_by_name(browser, 'loginfmt', email_address)
+    send_key_by_name(browser, 'loginfmt', Keys.RETURN)
     logging.debug(msg='Sent Email Address.')
-    time.sleep(10)
 
-    if not parser.use_authenticator:
+    if not use_authenticator:
         # wait for password form and enter password
-        time.sleep(0.5)
-        wait_until_clickable(By.NAME, 'passwd', 10)
-        send_key_by_name('passwd', pass_word)
+        wait_until_clickable(browser, By.NAME, 'passwd', wait_timeout('login_password'))
+        send_key_by_name(browser, 'passwd', pass_word)
         logging.debug(msg='Sent Password.')
-        # wait for 'sign in' button to be clickable and sign in
-        time.sleep(0.5)
-        send_key_by_name('passwd', Keys.RETURN)
-        time.sleep(0.5)
+        send_key_by_name(browser, 'passwd', Keys.RETURN)
         # Passwords only require the standard delay
-        wait_until_visible(By.ID, 'uhfLogo', 10)
+        wait_for(browser, ec.presence_of_element_located((By.ID, 'uhfLogo')), 'login_complete')
     else:
         # If using mobile 2FA, add a longer delay for sign in approval
-        wait_until_visible(By.ID, 'uhfLogo', 300)
+        wait_for(browser, ec.presence_of_element_located((By.ID, 'uhfLogo')), 'login_authenticator')
+    wait_for(browser, dom_ready(), 'login_complete')
+
+
+def account_key(email_address):
+    """
+    Stable file-name safe key for an account, does not reveal the email address
+    :param email_address: String
+    :return: String
+    """
+    return hashlib.sha256(email_address.strip().lower().encode()).hexdigest()[:16]
+
+
+def write_json_atomic(file_path, data):
+    """
+    Writes json to a temp file in the same directory, then swaps it in so readers never see a partial file
+    :param file_path: String
+    :param data: json serializable obj
+    :return: None
+    """
+    write_file_atomic(file_path, json.dumps(data))
+
+
+def write_file_atomic(file_path, text):
+    """
+    Writes text to a temp file in the same directory, then swaps it in so readers never see a partial file
+    :param file_path: String
+    :param text: String
+    :return: None
+    """
+    directory = os.path.dirname(file_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def session_path(email_address):
+    return os.path.join(SESSION_DIR, f'{account_key(email_address)}.json')
+
+
+def save_session(browser, email_address):
+    """
+    Saves the cookies of all domains with their expiry and a checksum
+    :param browser: webdriver obj
+    :param email_address: String
+    :return: None
+    """
+    cookies = browser.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+    session = {
+        'saved_at': time.time(),
+        'expires': time.time() + SESSION_MAX_AGE_HOURS * 3600,
+        'cookies': [{key: cookie[key] for key in _COOKIE_PARAM_KEYS if key in cookie} for cookie in cookies],
+    }
+    payload = json.dumps(session, sort_keys=True)
+    write_json_atomic(session_path(email_address), {
+        'checksum': hashlib.sha256(payload.encode()).hexdigest(),
+        'session': session,
+    })
+    os.chmod(session_path(email_address), 0o600)
+    logging.debug(msg=f'Saved {len(cookies)} cookies for {email_address}')
+
+
+def load_session(email_address):
+    """
+    Loads cached cookies if the cache file is intact and not expired
+    :param email_address: String
+    :return: list of cookie dicts, empty list if there is no usable session
+    """
+    file_path = session_path(email_address)
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        session = data['session']
+        checksum = hashlib.sha256(json.dumps(session, sort_keys=True).encode()).hexdigest()
+    except FileNotFoundError:
+        return []
+    except (ValueError, KeyError, TypeError):
+        logging.error(msg=f'Session cache for {email_address} is corrupt.')
+        return []
+    if checksum != data.get('checksum'):
+        logging.error(msg=f'Session cache for {email_address} failed checksum.')
+        return []
+    now = time.time()
+    if session['expires'] < now:
+        logging.info(msg=f'Session cache for {email_address} expired.')
+        return []
+    # session cookies have no expiry, persistent ones are dropped once they expire
+    return [cookie for cookie in session['cookies'] if cookie.get('expires', -1) <= 0 or cookie['expires'] > now]
+
+
+def discard_session(email_address):
+    try:
+        os.remove(session_path(email_address))
+    except FileNotFoundError:
+        pass
+
+
+def restore_session(browser, email_address):
+    """
+    Loads cached cookies into the browser and checks them against the dashboard
+    :param browser: webdriver obj
+    :param email_address: String
+    :return: Boolean if the browser is signed in
+    """
+    cookies = load_session(email_address)
+    if not cookies:
+        return False
+    browser.execute_cdp_cmd('Network.setCookies', {'cookies': cookies})
+    browser.get(DASHBOARD_URL)
+    wait_for(browser, dom_ready(), 'dashboard')
+    # signed out sessions are redirected to the login page
+    if browser.current_url.startswith(LOGIN_URL) or not find_by_id(browser, 'uhfLogo'):
+        logging.info(msg=f'Cached session for {email_address} is no longer valid.')
+        discard_session(email_address)
+        browser.delete_all_cookies()
+        return False
+    return True
 
-    time.sleep(0.5)
 
+def sign_in(browser, email_address, pass_word, args):
+    """
+    Signs in with the cached session when enabled and valid, else logs in through log_in
+    :param browser: webdriver obj
+    :param email_address: String
+    :param pass_word: String
+    :param args: argparse object
+    :return: None
+    """
+    if args.session_cache and restore_session(browser, email_address):
+        logging.info(msg=f'Restored cached session for {email_address}')
+    else:
+        log_in(browser, email_address, pass_word, args.use_authenticator)
+    if args.session_cache:
+        save_session(browser, email_address)
 
-def find_by_id(obj_id):
+
+def find_by_id(browser, obj_id):
     """
     Searches for elements matching ID
+    :param browser: webdriver obj
     :param obj_id:
     :return: List of all nodes matching provided ID
     """
     return browser.find_elements_by_id(obj_id)
 
 
-def find_by_xpath(selector):
+def find_by_xpath(browser, selector):
     """
     Finds elements by xpath
+    :param browser: webdriver obj
     :param selector: xpath string
     :return: returns a list of all matching selenium objects
     """
     return browser.find_elements_by_xpath(selector)
 
 
-def find_by_class(selector):
+def find_by_class(browser, selector):
     """
     Finds elements by class name
+    :param browser: webdriver obj
     :param selector: Class selector of html obj
     :return: returns a list of all matching selenium objects
     """
     return browser.find_elements_by_class_name(selector)
 
 
-def find_by_css(selector):
+def find_by_css(browser, selector):
     """
     Finds nodes by css selector
+    :param browser: webdriver obj
     :param selector: CSS selector of html node obj
     :return: returns a list of all matching selenium objects
     """
@@ -390,27 +1397,42 @@ def find_by_css(selector):
 #         browser.refresh()
 
 
-def wait_until_visible(by_, selector, time_to_wait=10):
+def wait_until_visible(browser, by_, selector, time_to_wait=10, refresh_after=None):
     """
     Searches for selector and if found, end the loop
-    Else, keep repeating every 2 seconds until time elapsed, then refresh page
+    Else, keep polling the current page every VISIBLE_POLL_INTERVAL seconds until time elapsed
+    :param browser: webdriver obj
     :param by_: string which tag to search by
     :param selector: string selector
     :param time_to_wait: int time to wait
+    :param refresh_after: int number of consecutive misses before the page is refreshed, None never refreshes
     :return: Boolean if selector is found
     """
+    found = False
+    misses = 0
+    refreshes = 0
     start_time = time.time()
     while (time.time() - start_time) < time_to_wait:
         if browser.find_elements(by=by_, value=selector):
-            return True
-        browser.refresh()  # for other checks besides points url
-        time.sleep(2)
-    return False
-
-
-def wait_until_clickable(by_, selector, time_to_wait=10):
+            found = True
+            break
+        misses += 1
+        if refresh_after and misses % refresh_after == 0:
+            browser.refresh()
+            refreshes += 1
+        time.sleep(VISIBLE_POLL_INTERVAL)
+    if misses:
+        # the legacy version reloaded on its first miss and at every check after that
+        legacy_reloads = max(1, math.ceil((time.time() - start_time) / LEGACY_VISIBLE_POLL_INTERVAL))
+        RUN_COUNTERS['reloads'] += refreshes
+        RUN_COUNTERS['reloads_saved'] += max(0, legacy_reloads - refreshes)
+    return found
+
+
+def wait_until_clickable(browser, by_, selector, time_to_wait=10):
     """
     Waits 5 seconds for element to be clickable
+    :param browser: webdriver obj
     :param by_:  BY module args to pick a selector
     :param selector: string of xpath, css_selector or other
     :param time_to_wait: Int time to wait
@@ -420,21 +1442,159 @@ def wait_until_clickable(by_, selector, time_to_wait=10):
         WebDriverWait(browser, time_to_wait).until(ec.element_to_be_clickable((by_, selector)))
     except TimeoutException:
         logging.exception(msg=f'{selector} element Not clickable - Timeout Exception', exc_info=False)
-        screenshot(selector)
+        screenshot(browser, selector)
     except UnexpectedAlertPresentException:
         # FIXME
         browser.switch_to.alert.dismiss()
         # logging.exception(msg=f'{selector} element Not Visible - Unexpected Alert Exception', exc_info=False)
-        # screenshot(selector)
+        # screenshot(browser, selector)
         # browser.refresh()
     except WebDriverException:
         logging.exception(msg=f'Webdriver Error for {selector} object')
-        screenshot(selector)
+        screenshot(browser, selector)
+
+
+def wait_timeout(step):
+    """
+    Looks up the ceiling for a wait step
+    :param step: key of WAIT_TIMEOUTS
+    :return: seconds to wait at most
+    """
+    return WAIT_TIMEOUTS.get(step, WAIT_TIMEOUTS['default'])
+
+
+class dom_ready(object):
+    """
+    Wait condition, true once the document has finished loading
+    """
+
+    def __call__(self, driver):
+        return driver.execute_script('return document.readyState') == 'complete'
+
+
+class url_changed(object):
+    """
+    Wait condition, true once the browser has navigated away from old_url
+    """
+
+    def __init__(self, old_url):
+        self.old_url = old_url
+
+    def __call__(self, driver):
+        return driver.current_url != self.old_url
+
+
+class new_window_opened(object):
+    """
+    Wait condition, returns the handle of a window not in known_handles once one is opened
+    """
+
+    def __init__(self, known_handles):
+        self.known_handles = set(known_handles)
+
+    def __call__(self, driver):
+        new_handles = [handle for handle in driver.window_handles if handle not in self.known_handles]
+        if new_handles:
+            return new_handles[-1]
+        return False
+
+
+class network_idle(object):
+    """
+    Wait condition, true once the page is loaded and no new resources were fetched for idle_time seconds
+    """
+
+    def __init__(self, idle_time=0.5):
+        self.idle_time = idle_time
+        self.resource_count = None
+        self.idle_since = None
+
+    def __call__(self, driver):
+        return self.settled(driver.execute_script(
+            "return document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1;"))
+
+    def settled(self, resource_count):
+        """
+        :param resource_count: Int resources fetched by the page, -1 while it is loading
+        :return: Boolean if the count has not changed for idle_time seconds
+        """
+        now = time.time()
+        if resource_count < 0 or resource_count != self.resource_count:
+            self.resource_count = resource_count
+            self.idle_since = now
+            return False
+        return now - self.idle_since >= self.idle_time
+
+
+class offer_type_identified(object):
+    """
+    Wait condition, returns the name of the first (name, css selector) signature found on the page
+    with one script call per check, or 'explore' once the page has settled without any match
+    """
+
+    def __init__(self, signatures):
+        self.signatures = [list(signature) for signature in signatures]
+        self.idle = network_idle()
+
+    def __call__(self, driver):
+        name, resource_count = driver.execute_script(_CLASSIFY_OFFER_SCRIPT, self.signatures)
+        if name:
+            return name
+        return 'explore' if self.idle.settled(resource_count) else False
+
+
+class quiz_progressed(object):
+    """
+    Wait condition, returns the quiz state from state_script once the quiz is complete or shows
+    a question with a fingerprint other than the last one
+    """
+
+    def __init__(self, state_script, fingerprint=None):
+        self.state_script = state_script
+        self.fingerprint = fingerprint
+
+    def __call__(self, driver):
+        quiz = driver.execute_script(self.state_script)
+        if quiz['complete'] or (quiz['options'] and quiz['fingerprint'] != self.fingerprint):
+            return quiz
+        return False
+
+
+def wait_for(browser, condition, step='default', poll_frequency=0.2):
+    """
+    Blocks until condition is met or the ceiling of the step expires
+    :param browser: webdriver obj
+    :param condition: callable taking the webdriver, e.g. dom_ready() or an expected_conditions object
+    :param step: key of WAIT_TIMEOUTS for the ceiling of this wait
+    :param poll_frequency: seconds between checks
+    :return: truthy value returned by condition, False on timeout
+    """
+    time_to_wait = wait_timeout(step)
+    try:
+        return WebDriverWait(
+            browser, time_to_wait, poll_frequency=poll_frequency,
+            ignored_exceptions=(NoSuchElementException, StaleElementReferenceException)).until(condition)
+    except TimeoutException:
+        logging.debug(msg=f'Wait for {step} timed out after {time_to_wait} seconds.')
+    except UnexpectedAlertPresentException:
+        browser.switch_to.alert.dismiss()
+    return False
+
+
+def wait_for_page(browser, step='default'):
+    """
+    Waits for the current page to finish loading, including its background requests
+    :param browser: webdriver obj
+    :param step: key of WAIT_TIMEOUTS for the ceiling of this wait
+    :return: Boolean if the page settled in time
+    """
+    return bool(wait_for(browser, dom_ready(), step) and wait_for(browser, network_idle(), step))
 
 
-def send_key_by_name(name, key):
+def send_key_by_name(browser, name, key):
     """
     Sends key to target found by name
+    :param browser: webdriver obj
     :param name: Name attribute of html object
     :param key: Key to be sent to that object
     :return: None
@@ -445,15 +1605,16 @@ def send_key_by_name(name, key):
         logging.exception(msg=f'Send key by name to {name} element not visible or clickable.')
     except NoSuchElementException:
         logging.exception(msg=f'Send key to {name} element, no such element.')
-        screenshot(name)
+        screenshot(browser, name)
         browser.refresh()
     except WebDriverException:
         logging.exception(msg=f'Webdriver Error for send key to {name} object')
 
 
-def send_key_by_id(obj_id, key):
+def send_key_by_id(browser, obj_id, key):
     """
     Sends key to target found by id
+    :param browser: webdriver obj
     :param obj_id: ID attribute of the html object
     :param key: Key to be sent to that object
     :return: None
@@ -464,15 +1625,16 @@ def send_key_by_id(obj_id, key):
         logging.exception(msg=f'Send key by ID to {obj_id} element not visible or clickable.')
     except NoSuchElementException:
         logging.exception(msg=f'Send key by ID to {obj_id} element, no such element')
-        screenshot(obj_id)
+        screenshot(browser, obj_id)
         browser.refresh()
     except WebDriverException:
         logging.exception(msg=f'Webdriver Error for send key by ID to {obj_id} object')
 
 
-def click_by_class(selector):
+def click_by_class(browser, selector):
     """
     Clicks on node object selected by class name
+    :param browser: webdriver obj
     :param selector: class attribute
     :return: None
     """
@@ -484,9 +1646,10 @@ def click_by_class(selector):
         logging.exception(msg=f'Webdriver Error for send key by class to {selector} object')
 
 
-def click_by_id(obj_id):
+def click_by_id(browser, obj_id):
     """
     Clicks on object located by ID
+    :param browser: webdriver obj
     :param obj_id: id tag of html object
     :return: None
     """
@@ -498,9 +1661,10 @@ def click_by_id(obj_id):
         logging.exception(msg=f'Webdriver Error for click by ID to {obj_id} object')
 
 
-def clear_by_id(obj_id):
+def clear_by_id(browser, obj_id):
     """
     Clear object found by id
+    :param browser: webdriver obj
     :param obj_id: ID attribute of html object
     :return: None
     """
@@ -510,15 +1674,16 @@ def clear_by_id(obj_id):
         logging.exception(msg=f'Clear by ID to {obj_id} element not visible or clickable.')
     except NoSuchElementException:
         logging.exception(msg=f'Send key by ID to {obj_id} element, no such element')
-        screenshot(obj_id)
+        screenshot(browser, obj_id)
         browser.refresh()
     except WebDriverException:
         logging.exception(msg='Error.')
 
 
-def main_window():
+def main_window(browser):
     """
     Closes current window and switches focus back to main window
+    :param browser: webdriver obj
     :return: None
     """
     try:
@@ -531,145 +1696,250 @@ def main_window():
         browser.switch_to.window(browser.window_handles[0])
 
 
-def screenshot(selector):
+def close_window(browser):
+    """
+    Closes the current window only and switches focus back to main window
+    Other offer windows stay open, see iter_dailies
+    :param browser: webdriver obj
+    :return: None
+    """
+    try:
+        if browser.current_window_handle != browser.window_handles[0]:
+            browser.close()
+    except WebDriverException:
+        logging.error('Error when closing window')
+    finally:
+        browser.switch_to.window(browser.window_handles[0])
+
+
+def screenshot(browser, selector):
     """
     Snaps screenshot of webpage when error occurs
+    :param browser: webdriver obj
     :param selector: The name, ID, class, or other attribute of missing node object
     :return: None
     """
     logging.exception(msg=f'{selector} cannot be located.')
     screenshot_file_name = f'{datetime.now().strftime("%Y%m%d%%H%M%S")}_{selector}.png'
-    screenshot_file_path = os.path.join('logs', screenshot_file_name)
+    screenshot_file_path = os.path.join(SCREENSHOT_DIR, screenshot_file_name)
     browser.save_screenshot(screenshot_file_path)
 
 
-def latest_window():
+def latest_window(browser):
     """
     Switches to newest open window
+    :param browser: webdriver obj
     :return:
     """
     browser.switch_to.window(browser.window_handles[-1])
+    sync_user_agent(browser)
 
 
-def search(search_terms, mobile_search=False):
+def sync_user_agent(browser):
     """
-    Searches using an enumerated list of search terms, prints search item and number
-    :param search_terms: enumerated list of tuples with search terms
-    :param mobile_search: Boolean, True for mobile search limits, default false for pc search limits
+    Devtools overrides only apply to the window they were sent to, reloads the current window with the override
+    :param browser: webdriver obj
+    :return: None
+    """
+    user_agent = _USER_AGENT_OVERRIDES.get(browser.session_id)
+    if user_agent and browser.execute_script('return navigator.userAgent') != user_agent:
+        browser.execute_cdp_cmd('Network.setUserAgentOverride', {'userAgent': user_agent})
+        browser.refresh()
+
+
+def submit_search(browser, term, method='type'):
+    """
+    Submits one search and waits for the results page
+    type: types into the search box like a user, 4 webdriver calls plus waits
+    url: navigates straight to the results url, 1 webdriver call
+    script: fills in and submits the search form with 1 webdriver call plus waits
+    :param browser: webdriver obj
+    :param term: String search term
+    :param method: one of SEARCH_METHODS
     :return: None
     """
+    if method == 'url':
+        # get returns once the results page has loaded
+        browser.get(f'{BING_SEARCH_URL}?{urlencode({"q": term})}')
+        return
+    results_url = browser.current_url
+    if method == 'script':
+        if not browser.execute_script(_SUBMIT_SEARCH_SCRIPT, term):
+            # no search form on the page, fall back to the results url
+            browser.get(f'{BING_SEARCH_URL}?{urlencode({"q": term})}')
+            return
+    else:
+        # clears search bar and enters in next search term
+        # reload only if the search box is still missing after a few seconds
+        wait_until_visible(browser, By.ID, 'sb_form_q', wait_timeout('search_box'), refresh_after=20)
+        results_url = browser.current_url
+        clear_by_id(browser, 'sb_form_q')
+        send_key_by_id(browser, 'sb_form_q', term)
+        send_key_by_id(browser, 'sb_form_q', Keys.RETURN)
+    # let ms reward website keep up, the search only counts once the results page has loaded
+    wait_for(browser, url_changed(results_url), 'search_results')
+    wait_for(browser, dom_ready(), 'search_results')
+
+
+@timed_span
+def search(browser, search_terms, mobile_search=False, term_store=None, method='type'):
+    """
+    Searches with each search term in turn, prints search item and number
+    :param browser: webdriver obj
+    :param search_terms: iterable of search terms, only drawn as far as needed, e.g. from sample_terms
+    :param mobile_search: Boolean, True for mobile search limits, default false for pc search limits
+    :param term_store: sqlite3 connection to record term uses in, optional
+    :param method: how searches are submitted, one of SEARCH_METHODS
+    :return: SearchProgress obj, None if there were no search terms
+    """
     if mobile_search:
         search_limit = 20
-        random.shuffle(search_terms)
-        search_terms = list(enumerate(search_terms, start=0))
     else:
         search_limit = 30
-        random.shuffle(search_terms)
-        search_terms = list(enumerate(search_terms, start=0))
+    search_terms = iter(search_terms or [])
+    first_term = next(search_terms, None)
 
     logging.info(msg="Search Start")
-    if search_terms == [] or search_terms is None:
+    if first_term is None:
         logging.info(msg="Search Aborted. No Search Terms.")
     else:
         browser.get(BING_SEARCH_URL)
         # ensure signed in not in mobile mode (pc mode doesn't register when searching)
         if not mobile_search:
-            ensure_pc_mode_logged_in()
+            ensure_pc_mode_logged_in(browser)
+        progress = SearchProgress(browser, mobile=mobile_search)
+        if progress.is_complete():
+            logging.info(msg='Search points already maxed.')
+            return progress
 
-        for num, item in search_terms:
+        for num, item in enumerate(itertools.chain([first_term], search_terms)):
             try:
-                # clears search bar and enters in next search term
-                time.sleep(1)
-                wait_until_visible(By.ID, 'sb_form_q', 15)
-                clear_by_id('sb_form_q')
-                send_key_by_id('sb_form_q', item)
-                time.sleep(0.1)
-                send_key_by_id('sb_form_q', Keys.RETURN)
+                submit_search(browser, item, method)
                 # prints search term and item, limited to 80 chars
                 logging.debug(msg=f'Search #{num}: {item[:80]}')
-                time.sleep(random.randint(3, 4))  # random sleep for more human-like, and let ms reward website keep up.
+                if term_store is not None:
+                    record_term_use(term_store, item)
+                progress.searched()
 
                 # check to see if search is complete, if yes, break out of loop
-                if num % search_limit == 0:
-                    if mobile_search:
-                        # in mobile mode, get point total does not work if no search is done, URL = 404
-                        if get_point_total(mobile=True):
-                            logging.info(msg=f'Stopped at search number {num}')
-                            return
+                complete = progress.is_complete()
+                # counters not readable over http, load the points flyout in the browser instead
+                if complete is None and num % search_limit == 0:
+                    # in mobile mode, get point total does not work if no search is done, URL = 404
+                    complete = get_point_total(browser, pc=not mobile_search, mobile=mobile_search)
+                    progress.capped = bool(complete)
+                    if not complete:
                         # if point total not met, return to search page
                         browser.get(BING_SEARCH_URL)
-                    else:
-                        if get_point_total(pc=True):
-                            logging.info(msg=f'Stopped at search number {num}')
-                            return
-                        browser.get(BING_SEARCH_URL)
+                if complete:
+                    logging.info(msg=f'Stopped at search number {num}')
+                    break
             except UnexpectedAlertPresentException:
                 browser.switch_to.alert.dismiss()
                 browser.get(BING_SEARCH_URL)
+        progress.log()
+        return progress
+
+
+def get_offers(browser):
+    """
+    Reads every offer card of the loaded dashboard with one script call
+    :param browser: webdriver obj
+    :return: list of dicts with index, href, title, type_hint ('poll', 'quiz' or None) and complete
+    """
+    return browser.execute_script(_GET_OFFERS_SCRIPT) or []
+
+
+def open_offer(browser, offer, main_handle):
+    """
+    Clicks an offer on the dashboard, which opens it in a new window
+    :param browser: webdriver obj
+    :param offer: offer dict from get_offers
+    :param main_handle: window handle of the dashboard
+    :return: handle of the new window, None if no window opened, False if the offer is gone
+    """
+    browser.switch_to.window(main_handle)
+    known_handles = browser.window_handles
+    if not browser.execute_script(_CLICK_OFFER_SCRIPT, offer['index'], offer['href']):
+        logging.info(msg=f'Offer {offer["title"]} is no longer on the dashboard.')
+        return False
+    handle = wait_for(browser, new_window_opened(known_handles), 'offer_window')
+    if handle:
+        browser.switch_to.window(handle)
+        sync_user_agent(browser)
+    return handle or None
 
 
-def iter_dailies():
+@timed_span
+def iter_dailies(browser, tabs=1):
     """
     Iterates through all outstanding dailies
+    Up to tabs offers are open at the same time, each in its own window, and the windows are
+    visited in turn, an offer is completed as soon as its page is ready
+    :param browser: webdriver obj
+    :param tabs: Int number of offer windows open at the same time
     :return: None
     """
     browser.get(DASHBOARD_URL)
-    time.sleep(4)
-    open_offers = browser.find_elements_by_xpath('//span[contains(@class, "mee-icon-AddMedium")]')
+    wait_for_page(browser, 'dashboard')
+    open_offers = [offer for offer in get_offers(browser) if not offer['complete']]
     if open_offers:
         logging.info(msg=f'Number of open offers: {len(open_offers)}')
-        # get common parent element of open_offers
-        parent_elements = [open_offer.find_element_by_xpath('..//..//..//..') for open_offer in open_offers]
-        # get points links from parent, # finds link (a) descendant of selected node
-        offer_links = [
-            parent.find_element_by_xpath(
-                'div[contains(@class,"actionLink")]//descendant::a')
-            for parent in parent_elements
-        ]
-        # iterate through the dailies
-        for offer in offer_links:
-            time.sleep(3)
-            logging.debug(msg='Detected offer.')
-            # click and switch focus to latest window
-            offer.click()
-            latest_window()
-            time.sleep(5)
-            # check for sign-in prompt
-            sign_in_prompt()
-            # check for poll by ID
-
-            if find_by_id('btoption0'):
-                logging.debug(msg='Poll identified.')
-                daily_poll()
-            # check for quiz by checking for ID
-            elif find_by_id('rqStartQuiz'):
-                click_by_id('rqStartQuiz')
-                # test for drag or drop or regular quiz
-                if find_by_id('rqAnswerOptionNum0'):
-                    logging.debug(msg='Drag and Drop Quiz identified.')
-                    drag_and_drop_quiz()
-                # look for lightning quiz indicator
-                elif find_by_id('rqAnswerOption0'):
-                    logging.debug(msg='Lightning Quiz identified.')
-                    lightning_quiz()
-            elif find_by_class('wk_Circle'):
-                logging.debug(msg='Click Quiz identified.')
-                click_quiz()
-            # else do scroll for exploring pages
-            else:
-                logging.debug(msg='Explore Daily identified.')
-                explore_daily()
+        offer_types = load_offer_types()
+        main_handle = browser.current_window_handle
+        pending = deque(open_offers)
+        # window handle to the state of the offer open in it
+        open_tabs = {}
+        while pending or open_tabs:
+            # open offers until tabs windows are open
+            while pending and len(open_tabs) < max(1, tabs):
+                offer = pending.popleft()
+                logging.debug(msg=f'Detected offer {offer["title"]} ({offer["type_hint"]}).')
+                handle = open_offer(browser, offer, main_handle)
+                if handle is None:
+                    # the offer opened in the dashboard window, complete it there and reload the dashboard
+                    run_offer(browser, classify_offer(browser, offer_types.get(offer['href'])))
+                    browser.get(DASHBOARD_URL)
+                    wait_for_page(browser, 'dashboard')
+                elif handle:
+                    cached_type = offer_types.get(offer['href'])
+                    open_tabs[handle] = {
+                        'offer': offer,
+                        'cached_type': cached_type,
+                        'probe': offer_type_identified(
+                            [(name, selector) for name, selector, _ in OFFER_GATES + OFFER_TYPES]),
+                        'deadline': time.time() + wait_timeout('offer_load'),
+                    }
+            # visit each open offer, complete the first one whose page is ready
+            ready_handle = None
+            for handle, state in open_tabs.items():
+                browser.switch_to.window(handle)
+                if state['probe'](browser) or time.time() > state['deadline']:
+                    ready_handle = handle
+                    break
+            if ready_handle is None:
+                time.sleep(0.2)
+                continue
+            state = open_tabs.pop(ready_handle)
+            offer_type = classify_offer(browser, state['cached_type'])
+            # explore only means no signature matched yet, caching it would hide a quiz that loads late
+            if offer_type in {name for name, _, _ in OFFER_TYPES}:
+                offer_types[state['offer']['href']] = offer_type
+            run_offer(browser, offer_type)
+        save_offer_types(offer_types)
+        # close windows the offers opened themselves
+        main_window(browser)
         # check at the end of the loop to log if any offers are remaining
         browser.get(DASHBOARD_URL)
-        time.sleep(0.1)
-        wait_until_visible(By.TAG_NAME, 'body', 10)  # checks for page load
-        open_offers = browser.find_elements_by_xpath('//span[contains(@class, "mee-icon-AddMedium")]')
+        wait_for_page(browser, 'dashboard')
+        open_offers = [offer for offer in get_offers(browser) if not offer['complete']]
         logging.info(msg=f'Number of incomplete offers remaining: {len(open_offers)}')
     else:
         logging.info(msg='No dailies found.')
 
 
-def explore_daily():
+@timed_span
+def explore_daily(browser):
     # needs try/except bc these functions don't have exception handling built in.
     try:
         # select html to send commands to
@@ -679,7 +1949,7 @@ def explore_daily():
             html.send_keys(Keys.END)
             html.send_keys(Keys.HOME)
         # exit to main window
-        main_window()
+        close_window(browser)
     except TimeoutException:
         logging.exception(msg='Explore Daily Timeout Exception.')
     except (ElementNotVisibleException, ElementClickInterceptedException, ElementNotInteractableException):
@@ -688,125 +1958,281 @@ def explore_daily():
         logging.exception(msg='Error.')
 
 
-def daily_poll():
+@timed_span
+def daily_poll(browser):
     """
     Randomly clicks a poll answer, returns to main window
+    :param browser: webdriver obj
     :return: None
     """
-    time.sleep(3)
-    # click poll option
     choices = ['btoption0', 'btoption1']  # new poll format
-    click_by_id(random.choice(choices))
-    time.sleep(3)
+    choice = random.choice(choices)
+    wait_until_clickable(browser, By.ID, choice, wait_timeout('quiz_round'))
+    # click poll option
+    click_by_id(browser, choice)
+    # let the vote request finish
+    wait_for(browser, network_idle(), 'quiz_round')
     # close window, switch to main
-    main_window()
-
-
-def lightning_quiz():
-    for question_round in range(10):
-        logging.debug(msg=f'Round# {question_round}')
-        if find_by_id('rqAnswerOption0'):
-            time.sleep(3)
-            for i in range(10):
-                if find_by_id(f'rqAnswerOption{i}'):
-                    browser.execute_script(f"document.querySelectorAll('#rqAnswerOption{i}').forEach(el=>el.click());")
-                    logging.debug(msg=f'Clicked {i}')
-                    time.sleep(2)
-        # let new page load
-        time.sleep(3)
-        if find_by_id('quizCompleteContainer'):
+    close_window(browser)
+
+
+@timed_span
+def lightning_quiz(browser):
+    """
+    Answers each question by trying its options in turn, a round ends as soon as the next question renders
+    :param browser: webdriver obj
+    :return: None
+    """
+    # wait for the first question
+    quiz = wait_for(browser, quiz_progressed(_LIGHTNING_QUIZ_STATE_SCRIPT), 'quiz_round')
+    for question_round in range(QUIZ_MAX_ROUNDS):
+        if not quiz or quiz['complete']:
             break
+        round_start = time.time()
+        progressed = False
+        for option in quiz['options']:
+            browser.execute_script("document.querySelectorAll('#' + arguments[0]).forEach(el=>el.click());", option)
+            logging.debug(msg=f'Clicked {option}')
+            # a wrong answer leaves the question on screen
+            progressed = wait_for(browser, quiz_progressed(_LIGHTNING_QUIZ_STATE_SCRIPT, quiz['fingerprint']),
+                                  'quiz_answer')
+            if progressed:
+                break
+        logging.debug(msg=f'Round# {question_round} took {time.time() - round_start:.1f} seconds')
+        quiz = progressed or wait_for(
+            browser, quiz_progressed(_LIGHTNING_QUIZ_STATE_SCRIPT, quiz['fingerprint']), 'quiz_round')
     # close the quiz completion splash
-    quiz_complete = find_by_css('.cico.btCloseBack')
+    quiz_complete = find_by_css(browser, '.cico.btCloseBack')
     if quiz_complete:
         quiz_complete[0].click()
-    time.sleep(3)
-    main_window()
+        wait_for(browser, network_idle(), 'quiz_answer')
+    close_window(browser)
 
 
-def click_quiz():
+@timed_span
+def click_quiz(browser):
     """
-    Start the quiz, iterates 10 times
+    Answers each question with a random choice, a round ends as soon as the next question renders
+    :param browser: webdriver obj
+    :return: None
     """
-    for i in range(10):
-        if find_by_css('.cico.btCloseBack'):
-            find_by_css('.cico.btCloseBack')[0].click()[0].click()
-            logging.debug(msg='Quiz popped up during a click quiz...')
-        choices = find_by_class('wk_Circle')
+    # the state script also closes quizzes that pop up during a click quiz
+    quiz = wait_for(browser, quiz_progressed(_CLICK_QUIZ_STATE_SCRIPT), 'quiz_round')
+    for question_round in range(QUIZ_MAX_ROUNDS):
+        # if the green check mark reward icon is visible, end loop
+        if not quiz or quiz['complete']:
+            break
+        round_start = time.time()
         # click answer
-        if choices:
-            random.choice(choices).click()
-            time.sleep(3)
+        browser.execute_script(
+            "document.querySelectorAll('.wk_Circle')[arguments[0]].click();", random.choice(quiz['options']))
         # click the 'next question' button
         # wait_until_clickable(By.ID, 'check', 10)
-        wait_until_clickable(By.CLASS_NAME, 'wk_button', 10)
+        wait_until_clickable(browser, By.CLASS_NAME, 'wk_button', wait_timeout('quiz_round'))
         # click_by_id('check')
-        click_by_class('wk_button')
-        # if the green check mark reward icon is visible, end loop
-        time.sleep(3)
-        if find_by_css('span[class="rw_icon"]'):
-            break
-    main_window()
+        click_by_class(browser, 'wk_button')
+        quiz = wait_for(browser, quiz_progressed(_CLICK_QUIZ_STATE_SCRIPT, quiz['fingerprint']), 'quiz_round')
+        logging.debug(msg=f'Round# {question_round} took {time.time() - round_start:.1f} seconds')
+    close_window(browser)
 
 
-def drag_and_drop_quiz():
+def pick_drag_swap(options, wrong_positions, seen_orders, attempted):
     """
-    Checks for drag quiz answers and exits when none are found.
+    Picks the next swap of a drag and drop question
+    Options marked correct stay where they are, and an option is never moved to a position it was
+    already seen to be wrong at, so every swap tests at least one new option and position
+    :param options: list of option dicts from the quiz state, in position order
+    :param wrong_positions: set of (option text, position) seen without the correct mark
+    :param seen_orders: set of option text tuples the question has already shown
+    :param attempted: set of (order, position, position) swaps already sent
+    :return: tuple of the two positions to swap, None if no untested swap is left
+    """
+    order = tuple(option['text'] for option in options)
+    unfixed = [position for position, option in enumerate(options) if not option['correct']]
+    for position in unfixed:
+        candidates = []
+        for other in unfixed:
+            if other == position or (order[other], position) in wrong_positions:
+                continue
+            new_order = list(order)
+            new_order[position], new_order[other] = order[other], order[position]
+            if tuple(new_order) in seen_orders or (order, position, other) in attempted:
+                continue
+            # prefer swaps which also test the displaced option at a new position
+            candidates.append(((order[position], other) in wrong_positions, other))
+        if candidates:
+            return position, min(candidates)[1]
+    return None
+
+
+@timed_span
+def drag_and_drop_quiz(browser):
+    """
+    Solves drag and drop quizzes by swapping options until all are marked correct, one question after another
+    :param browser: webdriver obj
     :return: None
     """
-    for i in range(100):
-        try:
-            # find possible solution buttons
-            drag_option = find_by_class('rqOption')
-            # find any answers marked correct with correctAnswer tag
-            right_answers = find_by_class('correctAnswer')
-            # remove right answers from possible choices
-            if right_answers:
-                drag_option = [x for x in drag_option if x not in right_answers]
-            if drag_option:
-                # select first possible choice and remove from options
-                choice_a = random.choice(drag_option)
-                drag_option.remove(choice_a)
-                # select second possible choice from remaining options
-                choice_b = random.choice(drag_option)
-                ActionChains(browser).drag_and_drop(choice_a, choice_b).perform()
-        except (WebDriverException, TypeError):
-            logging.debug(msg='Unknown Error.')
+    moves = 0
+    question = None
+    wrong_positions = set()
+    seen_orders = set()
+    attempted = set()
+    quiz = wait_for(browser, quiz_progressed(_DRAG_QUIZ_STATE_SCRIPT), 'quiz_round')
+    while quiz and not quiz['complete'] and moves < DRAG_QUIZ_MAX_MOVES:
+        if all(option['correct'] for option in quiz['options']):
+            # question solved, wait for the next one or the completion splash
+            quiz = wait_for(browser, quiz_progressed(_DRAG_QUIZ_STATE_SCRIPT, quiz['fingerprint']), 'quiz_round')
             continue
-        finally:
-            time.sleep(3)
-            if find_by_id('quizCompleteContainer'):
-                break
+        order = tuple(option['text'] for option in quiz['options'])
+        if sorted(order) != question:
+            # next question, forget what was learned about the last one
+            question = sorted(order)
+            wrong_positions.clear()
+            seen_orders.clear()
+            attempted.clear()
+        seen_orders.add(order)
+        for position, option in enumerate(quiz['options']):
+            if not option['correct']:
+                wrong_positions.add((option['text'], position))
+        swap = pick_drag_swap(quiz['options'], wrong_positions, seen_orders, attempted)
+        if swap is None:
+            logging.info(msg='Drag and drop quiz has no untested swaps left.')
+            break
+        attempted.add((order,) + swap)
+        moves += 1
+        try:
+            drag_options = find_by_class(browser, 'rqOption')
+            ActionChains(browser).drag_and_drop(drag_options[swap[0]], drag_options[swap[1]]).perform()
+        except (WebDriverException, IndexError):
+            logging.debug(msg='Drag and drop failed.', exc_info=True)
+        quiz = (wait_for(browser, quiz_progressed(_DRAG_QUIZ_STATE_SCRIPT, quiz['fingerprint']), 'quiz_answer')
+                or browser.execute_script(_DRAG_QUIZ_STATE_SCRIPT))
+    RUN_COUNTERS['drag_quizzes'] += 1
+    RUN_COUNTERS['drag_quiz_moves'] += moves
+    logging.info(msg=f'Drag and drop quiz took {moves} moves.')
     # close the quiz completion splash
-    time.sleep(3)
-    quiz_complete = find_by_css('.cico.btCloseBack')
+    quiz_complete = find_by_css(browser, '.cico.btCloseBack')
     if quiz_complete:
         quiz_complete[0].click()
-    time.sleep(3)
-    main_window()
+        wait_for(browser, network_idle(), 'quiz_answer')
+    close_window(browser)
 
 
-def sign_in_prompt():
-    time.sleep(3)
-    sign_in_prompt_msg = find_by_class('simpleSignIn')
+def sign_in_prompt(browser):
+    sign_in_prompt_msg = find_by_class(browser, 'simpleSignIn')
     if sign_in_prompt_msg:
         logging.info(msg='Detected sign-in prompt')
+        offer_url = browser.current_url
         browser.find_element_by_link_text('Sign in').click()
         logging.info(msg='Clicked sign-in prompt')
-        time.sleep(4)
+        wait_for(browser, url_changed(offer_url), 'sign_in')
+        wait_for_page(browser, 'sign_in')
+
+
+def start_quiz(browser):
+    click_by_id(browser, 'rqStartQuiz')
+
+
+# states of an offer page that come before the offer itself, (name, css selector, handler)
+# the handler clears the state, then the page is classified again
+OFFER_GATES = [
+    ('sign_in', '.simpleSignIn', sign_in_prompt),
+    ('quiz', '#rqStartQuiz', start_quiz),
+]
+# offer types, (name, css selector found only on that type of offer, handler), checked in order
+# pages without any of the selectors are explore dailies
+OFFER_TYPES = [
+    ('poll', '#btoption0', daily_poll),
+    ('drag_and_drop', '#rqAnswerOptionNum0', drag_and_drop_quiz),
+    ('lightning', '#rqAnswerOption0', lightning_quiz),
+    ('click_quiz', '.wk_Circle', click_quiz),
+]
+
+
+def register_offer_type(name, selector, handler, before=None):
+    """
+    Adds a new type of offer without changing iter_dailies
+    :param name: String offer type name
+    :param selector: css selector found only on this type of offer
+    :param handler: function taking the webdriver, completes the offer and returns to the main window
+    :param before: name of an offer type the new one is checked before, default is last
+    :return: None
+    """
+    names = [offer_type[0] for offer_type in OFFER_TYPES]
+    OFFER_TYPES.insert(names.index(before) if before in names else len(OFFER_TYPES), (name, selector, handler))
 
 
-def get_point_total(pc=False, mobile=False, log=False):
+def load_offer_types():
+    """
+    Loads the offer types identified today
+    :return: dict of offer url to offer type name
+    """
+    try:
+        with open(OFFER_TYPE_CACHE, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('date_cached') != datetime.now().strftime('%Y%m%d'):
+        return {}
+    return data.get('types', {})
+
+
+def save_offer_types(offer_types):
+    write_json_atomic(OFFER_TYPE_CACHE, {'date_cached': datetime.now().strftime('%Y%m%d'), 'types': offer_types})
+
+
+def classify_offer(browser, cached_type=None):
+    """
+    Identifies the type of the open offer, checking every signature with one script call per poll
+    and returning as soon as any matches, sign-in prompts and quiz start pages are cleared on the way
+    :param browser: webdriver obj
+    :param cached_type: offer type found for this offer earlier today, only its signature is checked,
+        every signature is checked if it is not one of OFFER_TYPES
+    :return: String offer type name, 'explore' if the page settled without a match, None if it did not settle
+    """
+    offer_types = [offer_type for offer_type in OFFER_TYPES if offer_type[0] == cached_type] or list(OFFER_TYPES)
+    gates = list(OFFER_GATES)
+    while True:
+        signatures = [(name, selector) for name, selector, _ in gates + offer_types]
+        offer_type = wait_for(browser, offer_type_identified(signatures), 'offer_load')
+        if not offer_type:
+            logging.debug(msg='Offer not identified before timeout.')
+            return None
+        gate = next((gate for gate in gates if gate[0] == offer_type), None)
+        if gate is None:
+            logging.debug(msg=f'Offer identified as {offer_type}.')
+            return offer_type
+        # each gate is passed at most once
+        gates.remove(gate)
+        logging.debug(msg=f'Offer page shows {offer_type} first.')
+        gate[2](browser)
+
+
+def run_offer(browser, offer_type):
+    """
+    Completes an offer with the handler of its type
+    :param browser: webdriver obj
+    :param offer_type: String offer type name, pages of unknown type are explored
+    :return: None
+    """
+    handlers = {name: handler for name, _, handler in OFFER_TYPES}
+    handlers.get(offer_type, explore_daily)(browser)
+
+
+@timed_span
+def get_point_total(browser, pc=False, mobile=False, log=False):
     """
     Checks for points for pc/edge and mobile, logs if flag is set
+    :param browser: webdriver obj
     :return: Boolean for either pc/edge or mobile points met
     """
     browser.get(POINT_TOTAL_URL)
+    wait_for(browser, dom_ready(), 'point_total')
     # get number of total number of points
     # wait_until_visible(By.XPATH, '//*[@id="flyoutContent"]', 10)  # check for loaded point display
 
     # TODO add a scroll to obj here
-    if not wait_until_visible(By.CLASS_NAME, 'pcsearch', 10):  # if object not found, return False
+    if not wait_until_visible(browser, By.CLASS_NAME, 'pcsearch', wait_timeout('point_total')):  # if object not found, return False
         return False
     # returns None if pc search not found
     # pcsearch = browser.find_element_by_class_name('pcsearch')
@@ -849,6 +2275,127 @@ def get_point_total(pc=False, mobile=False, log=False):
         return True
 
 
+def fetch_point_counters(browser, session):
+    """
+    Reads the point counters from the points flyout over plain http, with the cookies and user agent of the browser
+    Much cheaper than loading the flyout in the browser and navigating back
+    :param browser: webdriver obj
+    :param session: requests.Session obj of this account, account cookies are never sent from the shared session
+    :return: dict of counter name to (current, max) points, None if the flyout could not be read
+    """
+    try:
+        cookies = browser.execute_cdp_cmd('Network.getCookies', {'urls': [POINT_TOTAL_URL]})['cookies']
+        user_agent = browser.execute_script('return navigator.userAgent')
+        response = session.get(
+            POINT_TOTAL_URL, timeout=HTTP_TIMEOUT,
+            headers={'User-Agent': user_agent,
+                     'Cookie': '; '.join(f'{cookie["name"]}={cookie["value"]}' for cookie in cookies)})
+        response.raise_for_status()
+        page = lxml_html.fromstring(response.text)
+    except (RequestException, WebDriverException, ValueError):
+        logging.debug(msg='Point counters not readable over http.', exc_info=True)
+        return None
+    counters = {}
+    for counter in ('pcsearch', 'mobilesearch'):
+        nodes = page.xpath(f'//*[contains(concat(" ", normalize-space(@class), " "), " {counter} ")]')
+        try:
+            current_points, max_points = map(int, nodes[0].text_content().split('/'))
+        except (IndexError, ValueError):
+            continue
+        counters[counter] = (current_points, max_points)
+    return counters or None
+
+
+class SearchProgress(object):
+    """
+    Tracks the search points of one phase from the point counters, predicts how many searches are left
+    and only checks the counters again once that many searches are done
+    """
+
+    def __init__(self, browser, mobile=False):
+        self.browser = browser
+        self.counter = 'mobilesearch' if mobile else 'pcsearch'
+        self.session = new_http_session()
+        self.start_points = None
+        self.points = None
+        self.max_points = None
+        self.queries = 0
+        self.next_check = 0
+        # set once the counters or the get_point_total fallback show the cap is reached
+        self.capped = False
+
+    def probe(self):
+        """
+        Reads the current points
+        :return: Boolean if the counters could be read
+        """
+        counters = fetch_point_counters(self.browser, self.session)
+        if not counters or self.counter not in counters:
+            return False
+        self.points, self.max_points = counters[self.counter]
+        if self.start_points is None:
+            self.start_points = self.points
+        return True
+
+    @property
+    def efficiency(self):
+        """
+        Points earned per search so far, None before any search earned points
+        """
+        if not self.queries or self.start_points is None or self.points <= self.start_points:
+            return None
+        return (self.points - self.start_points) / self.queries
+
+    def remaining_searches(self):
+        return math.ceil((self.max_points - self.points) / (self.efficiency or POINTS_PER_SEARCH))
+
+    def searched(self):
+        self.queries += 1
+
+    @property
+    def remaining_points(self):
+        """
+        Search points left until the cap, None if the counters were never read
+        """
+        if self.points is None:
+            return None
+        return max(0, self.max_points - self.points)
+
+    def is_complete(self):
+        """
+        Checks the counters once the predicted searches are done
+        :return: True if the cap is reached, False if not or not checked yet, None if the counters are unreadable
+        """
+        if self.next_check == math.inf:
+            return None
+        if self.queries < self.next_check:
+            return False
+        if not self.probe():
+            # the mobile flyout is a 404 until the first search, only a failure after that turns the probe off
+            if self.queries:
+                # the flyout is rendered by javascript or rejects the cookies, probing again only costs round trips
+                logging.debug(msg=f'{self.counter} counters not readable over http for the rest of the phase')
+                self.next_check = math.inf
+            return None
+        if self.points >= self.max_points:
+            self.capped = True
+            return True
+        # points are credited with a delay, check at least every search once the prediction is reached
+        remaining = self.remaining_searches()
+        self.next_check = self.queries + max(1, remaining)
+        logging.debug(msg=f'{self.counter} {self.points}/{self.max_points}, about {remaining} searches left')
+        return False
+
+    def log(self):
+        RUN_COUNTERS['search_queries'] += self.queries
+        if self.start_points is None:
+            return
+        gained = self.points - self.start_points
+        RUN_COUNTERS['search_points'] += gained
+        logging.info(msg=f'{self.counter} earned {gained} points in {self.queries} searches, '
+                         f'{gained / max(1, self.queries):.1f} points per search')
+
+
 def get_email_links():
     """
     Gets the email links from the text file, appends to a list
@@ -861,10 +2408,11 @@ def get_email_links():
     return links
 
 
-def click_email_links(links):
+def click_email_links(browser, links):
     """
     Receives list of string URLs and clicks through them.
     Manual mode only, quizzes are still in flux and not standardized yet.
+    :param browser: webdriver obj
     :param links: List of string URLs
     :return: None
     """
@@ -873,24 +2421,885 @@ def click_email_links(links):
         input('Press any key to continue.')
 
 
-def ensure_pc_mode_logged_in():
+def ensure_pc_mode_logged_in(browser):
     """
     Navigates to www.bing.com and clicks on ribbon to ensure logged in
     PC mode for some reason sometimes does not fully recognize that the user is logged in
+    :param browser: webdriver obj
     :return: None
     """
     browser.get(BING_SEARCH_URL)
-    time.sleep(0.1)
     # click on ribbon to ensure logged in
-    wait_until_clickable(By.ID, 'id_l', 15)
-    click_by_id('id_l')
-    time.sleep(0.1)
+    wait_until_clickable(browser, By.ID, 'id_l', wait_timeout('search_box'))
+    click_by_id(browser, 'id_l')
+    wait_for(browser, dom_ready(), 'search_results')
+
+
+@timed_span
+def mobile_phase(browser, args, search_terms_db, used_terms, journal):
+    """
+    Completes the mobile dailies and mobile searches for a signed in browser
+    :param browser: webdriver obj
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param used_terms: set of terms already searched by this account
+    :param journal: RunJournal obj of the account, finished phases are skipped
+    :return: None
+    """
+    if not journal.done('mobile_dailies'):
+        try:
+            iter_dailies(browser, args.tabs)
+            main_window(browser)
+            journal.record('mobile_dailies')
+        except:
+            logging.info(msg=f'Mobile App Task not found')
+    if not journal.done('mobile_search'):
+        browser.get(BING_SEARCH_URL)
+        # mobile search
+        with closing(open_term_store(search_terms_db)) as term_store:
+            search_terms = sample_terms(term_store, SEARCH_TERMS_PER_PHASE['mobile'], exclude=used_terms)
+            journal.record_search('mobile_search', search(
+                browser, search_terms, mobile_search=True, term_store=term_store, method=args.search_method))
+    # get point totals if running just in mobile mode
+    if not args.pc_mode or not args.quiz_mode or not args.email_mode:
+        get_point_total(browser, mobile=True, log=True)
+
+
+@timed_span
+def pc_phase(browser, args, search_terms_db, email_links, used_terms, journal):
+    """
+    Completes pc searches, quizzes and email links for a signed in browser
+    :param browser: webdriver obj
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param used_terms: set of terms already searched by this account
+    :param email_links: list of string URLs
+    :param journal: RunJournal obj of the account, finished phases are skipped
+    :return: None
+    """
+    browser.get(DASHBOARD_URL)
+    if args.pc_mode and not journal.done('pc_search'):
+        browser.get(BING_SEARCH_URL)
+        # pc edge search
+        with closing(open_term_store(search_terms_db)) as term_store:
+            search_terms = sample_terms(term_store, SEARCH_TERMS_PER_PHASE['pc'], exclude=used_terms)
+            journal.record_search('pc_search', search(
+                browser, search_terms, term_store=term_store, method=args.search_method))
+    if args.quiz_mode and not journal.done('dailies'):
+        # complete quizzes
+        iter_dailies(browser, args.tabs)
+        journal.record('dailies')
+    if args.email_mode and not journal.done('email_links'):
+        click_email_links(browser, email_links)
+        journal.record('email_links')
+    # ensure logged in, log points
+    ensure_pc_mode_logged_in(browser)
+    get_point_total(browser, log=True)
+
+
+class RunJournal(object):
+    """
+    Durable record of the phases an account finished today, so a restarted run skips them
+    Entries are appended to journal/<date>.jsonl and fsync'd, one line per finished phase, keyed by
+    account_key so the file does not reveal email addresses. Worker processes append to the same file.
+    """
+
+    def __init__(self, email_address, resume=True, directory=JOURNAL_DIR):
+        self.account = account_key(email_address)
+        self.resume = resume
+        self.path = os.path.join(directory, f'{datetime.now().strftime("%Y%m%d")}.jsonl')
+        # latest entry of each phase of this account
+        self.phases = {}
+        for entry in self.read(self.path):
+            if entry.get('account') == self.account:
+                self.phases[entry['phase']] = entry
+
+    @staticmethod
+    def read(path):
+        """
+        Reads every entry of a journal file, a line cut short by a crash is skipped
+        :param path: String
+        :return: list of dicts
+        """
+        entries = []
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return entries
+
+    def finished(self, phase):
+        """
+        :param phase: String, one of MOBILE_PHASES or PC_PHASES
+        :return: Boolean if the phase was finished today and the run resumes
+        """
+        return self.resume and bool(self.phases.get(phase, {}).get('done'))
+
+    def done(self, phase):
+        if self.finished(phase):
+            logging.info(msg=f'Skipping {phase}, finished earlier today.')
+            return True
+        return False
+
+    def record(self, phase, done=True, **details):
+        """
+        Appends an entry for the phase and flushes it to disk before returning
+        :param phase: String
+        :param done: Boolean if the phase is finished
+        :param details: extra json serializable fields, e.g. remaining points
+        :return: None
+        """
+        entry = dict(details, account=self.account, phase=phase, done=done, time=round(time.time()))
+        self.phases[phase] = entry
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # one write per line, appends from several processes do not interleave
+        file_descriptor = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            line = json.dumps(entry) + '\n'
+            # a line cut short by a crash must not swallow this one
+            size = os.fstat(file_descriptor).st_size
+            if size:
+                os.lseek(file_descriptor, size - 1, os.SEEK_SET)
+                if os.read(file_descriptor, 1) != b'\n':
+                    line = '\n' + line
+            os.write(file_descriptor, line.encode())
+            os.fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
+
+    def record_search(self, phase, progress):
+        """
+        Records a search phase, finished only once its cap was seen, a phase that ran out of terms is left to retry
+        :param phase: String
+        :param progress: SearchProgress obj returned by search(), None if there were no search terms
+        :return: None
+        """
+        if progress is None:
+            return
+        remaining = 0 if progress.capped else progress.remaining_points
+        self.record(phase, done=progress.capped, remaining=remaining)
+
+    def all_done(self, phases):
+        if all(self.finished(phase) for phase in phases):
+            logging.info(msg=f'Skipping {", ".join(phases)}, finished earlier today.')
+            return True
+        return False
+
+
+class BrowserPool(object):
+    """
+    Browsers started ahead of time on a background thread, so chrome startup is off the critical path
+    Released browsers are reset by clearing cookies and storage instead of being relaunched,
+    browsers which fail a health check are quit and replaced
+    """
+
+    def __init__(self, size, headless_mode, launch_profile='full'):
+        self.size = size
+        self.headless_mode = headless_mode
+        self.launch_profile = launch_profile
+        self.idle = deque()
+        self.launching = 0
+        self.checked_out = set()
+        self.closed = False
+        self.ready = threading.Condition()
+
+    def prelaunch(self):
+        """
+        Starts browsers in the background until size are idle, starting or checked out
+        :return: None
+        """
+        with self.ready:
+            while not self.closed and len(self.idle) + self.launching + len(self.checked_out) < self.size:
+                self.launching += 1
+                threading.Thread(target=self._launch, name='browser-prelaunch', daemon=True).start()
+
+    def _launch(self):
+        browser = None
+        try:
+            browser = browser_setup(self.headless_mode, PC_USER_AGENT, self.launch_profile)
+        except Exception:
+            logging.exception(msg='Browser prelaunch failed.')
+        with self.ready:
+            self.launching -= 1
+            if browser is not None and not self.closed:
+                self.idle.append(browser)
+                browser = None
+            self.ready.notify_all()
+        if browser is not None:
+            browser.quit()
+
+    @staticmethod
+    def healthy(browser):
+        """
+        Checks that chrome and chromedriver still answer
+        :param browser: webdriver obj
+        :return: Boolean
+        """
+        try:
+            return browser.execute_script('return 1') == 1 and bool(browser.window_handles)
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def evict(browser):
+        logging.info(msg='Evicting a crashed browser from the pool.')
+        try:
+            browser.quit()
+        except WebDriverException:
+            pass
+
+    def acquire(self, user_agent):
+        """
+        Takes a healthy idle browser, waits for one that is starting, or starts one if none is
+        Starts a replacement in the background if the pool is short of browsers
+        :param user_agent: String
+        :return: webdriver obj
+        """
+        browser = None
+        with self.ready:
+            while browser is None and (self.idle or self.launching):
+                if not self.idle:
+                    self.ready.wait()
+                    continue
+                browser = self.idle.popleft()
+                if not self.healthy(browser):
+                    self.evict(browser)
+                    browser = None
+        try:
+            if browser is None:
+                browser = browser_setup(self.headless_mode, PC_USER_AGENT, self.launch_profile)
+            set_user_agent(browser, user_agent)
+        except Exception:
+            if browser is not None:
+                self.evict(browser)
+            self.prelaunch()
+            raise
+        with self.ready:
+            self.checked_out.add(browser)
+        self.prelaunch()
+        return browser
+
+    def release(self, browser):
+        """
+        Resets a browser for the next account and returns it to the pool, quits it if the pool is full
+        Browsers that fail the reset are replaced in the background
+        :param browser: webdriver obj
+        :return: None
+        """
+        with self.ready:
+            self.checked_out.discard(browser)
+        try:
+            for handle in browser.window_handles[1:]:
+                browser.switch_to.window(handle)
+                browser.close()
+            browser.switch_to.window(browser.window_handles[0])
+            browser.get('about:blank')
+            browser.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            browser.execute_cdp_cmd('Network.clearBrowserCache', {})
+            origins = {'https://www.bing.com', 'https://login.live.com', 'https://account.microsoft.com',
+                       'https://rewards.microsoft.com'}
+            origins.update(re.match(r'[^:]+://[^/]+', url).group(0)
+                           for url in (LOGIN_URL, BING_SEARCH_URL, DASHBOARD_URL, POINT_TOTAL_URL))
+            for origin in origins:
+                browser.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        except WebDriverException:
+            self.evict(browser)
+            self.prelaunch()
+            return
+        with self.ready:
+            if not self.closed and len(self.idle) + self.launching + len(self.checked_out) < self.size:
+                self.idle.append(browser)
+                self.ready.notify_all()
+                return
+        browser.quit()
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            browsers = list(self.idle)
+            self.idle.clear()
+        for browser in browsers:
+            try:
+                browser.quit()
+            except WebDriverException:
+                pass
+
+
+def browser_pool(args):
+    """
+    Returns the browser pool of this process, worker processes each get their own
+    :param args: argparse object
+    :return: BrowserPool obj
+    """
+    global _BROWSER_POOL, _BROWSER_POOL_PID
+    if _BROWSER_POOL is None or _BROWSER_POOL_PID != os.getpid():
+        _BROWSER_POOL = BrowserPool(args.warm_pool, args.headless_setting, args.launch_profile)
+        _BROWSER_POOL_PID = os.getpid()
+        # quits the idle browsers when the process exits, also in worker processes which skip atexit
+        multiprocessing.util.Finalize(_BROWSER_POOL, _BROWSER_POOL.close, exitpriority=10)
+    return _BROWSER_POOL
+
+
+def open_browser(args, user_agent):
+    """
+    Starts a browser, or takes one from the warm pool with --warm-pool
+    :param args: argparse object
+    :param user_agent: String
+    :return: webdriver obj
+    """
+    global _PRELAUNCHED_BROWSER
+    if _JOB_DEADLINE is not None and time.time() >= _JOB_DEADLINE:
+        raise TimeoutException('Account job ran out of time.')
+    browser = None
+    if _PRELAUNCHED_BROWSER is not None:
+        prelaunched_user_agent, future = _PRELAUNCHED_BROWSER
+        _PRELAUNCHED_BROWSER = None
+        try:
+            browser = future.result()
+            if prelaunched_user_agent != user_agent:
+                set_user_agent(browser, user_agent)
+        except Exception:
+            logging.exception(msg='Prelaunched browser failed, starting a new one.')
+            browser = None
+    if browser is None and args.warm_pool > 0:
+        browser = browser_pool(args).acquire(user_agent)
+    elif browser is None:
+        browser = browser_setup(args.headless_setting, user_agent, args.launch_profile)
+    _ACTIVE_BROWSERS.add(browser)
+    return browser
+
+
+def close_browser(args, browser):
+    """
+    Quits a browser, or resets it and returns it to the warm pool with --warm-pool
+    :param args: argparse object
+    :param browser: webdriver obj
+    :return: None
+    """
+    _ACTIVE_BROWSERS.discard(browser)
+    if args.warm_pool > 0:
+        browser_pool(args).release(browser)
+    else:
+        browser.quit()
+
+
+def quit_active_browsers():
+    """
+    Quits every browser of the running job, its next webdriver command fails and the job ends
+    :return: None
+    """
+    logging.warning(msg='Account job ran out of time, quitting its browsers.')
+    for browser in list(_ACTIVE_BROWSERS):
+        try:
+            browser.quit()
+        except Exception:
+            logging.debug(msg='Browser did not quit cleanly.', exc_info=True)
+
+
+def requested_phases(args):
+    """
+    :param args: argparse object
+    :return: list of the MOBILE_PHASES and PC_PHASES the arguments ask for
+    """
+    return ((MOBILE_PHASES if args.mobile_mode else [])
+            + [phase for phase, enabled in zip(PC_PHASES, (args.pc_mode, args.quiz_mode, args.email_mode)) if enabled])
+
+
+def run_account(email, password, args, search_terms_db, email_links):
+    """
+    Runs one account in a span tagged with its account key, writes its prometheus textfile if asked to
+    :param email: String
+    :param password: String
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param email_links: list of string URLs
+    :return: None
+    """
+    SPAN_TAGS.update(account=account_key(email), mode='')
+    _SPAN_TOTALS.clear()
+    journal = RunJournal(email, resume=not args.no_resume)
+    try:
+        with span('account'):
+            run_account_phases(email, password, args, search_terms_db, email_links, journal)
+    finally:
+        SPAN_TAGS['mode'] = ''
+        if args.prometheus_dir:
+            write_prometheus_textfile(args.prometheus_dir)
+
+
+def run_account_phases(email, password, args, search_terms_db, email_links, journal):
+    """
+    Runs the mobile and pc phases for one account
+    Each phase starts a fresh browser, unless args.single_browser is set, then the pc phase
+    switches the user agent of the mobile browser and reuses its login
+    :param email: String
+    :param password: String
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param email_links: list of string URLs
+    :param journal: RunJournal obj of the account, phases finished earlier today are skipped
+    :return: None
+    """
+    browser = None
+    # the pc phase does not repeat terms of the mobile phase
+    used_terms = set()
+    pc_phases = [phase for phase in requested_phases(args) if phase in PC_PHASES]
+    if args.mobile_mode and not journal.all_done(MOBILE_PHASES):
+        # MOBILE MODE
+        logging.info(msg='-------------------------MOBILE-------------------------')
+        SPAN_TAGS['mode'] = 'mobile'
+        # set up headless browser and mobile user agent
+        browser = open_browser(args, MOBILE_USER_AGENT)
+        try:
+            sign_in(browser, email, password, args)
+            mobile_phase(browser, args, search_terms_db, used_terms, journal)
+            if not args.single_browser:
+                close_browser(args, browser)
+                browser = None
+        except KeyboardInterrupt:
+            close_browser(args, browser)
+            browser = None
+        except WebDriverException:
+            logging.info(msg=f'WebDriverException while executing mobile portion', exc_info=True)
+            RUN_COUNTERS['browser_errors'] += 1
+            close_browser(args, browser)
+            browser = None
+
+    if pc_phases and not journal.all_done(pc_phases):
+        # PC MODE
+        logging.info(msg='-------------------------PC-------------------------')
+        SPAN_TAGS['mode'] = 'pc'
+        logged_in = browser is not None
+        if logged_in:
+            # keep the mobile browser and its session, only the user agent changes
+            set_user_agent(browser, PC_USER_AGENT)
+        else:
+            # set up edge headless browser and edge pc user agent
+            browser = open_browser(args, PC_USER_AGENT)
+        try:
+            if not logged_in:
+                sign_in(browser, email, password, args)
+            pc_phase(browser, args, search_terms_db, email_links, used_terms, journal)
+        except KeyboardInterrupt:
+            print('Stopping Script...')
+        except WebDriverException:
+            logging.error(msg=f'WebDriverException while executing pc portion', exc_info=True)
+            RUN_COUNTERS['browser_errors'] += 1
+        finally:
+            close_browser(args, browser)
+    elif browser is not None:
+        close_browser(args, browser)
+
+
+def run_job(email, password, args, search_terms_db, email_links, deadline):
+    """
+    Runs one account until a deadline, a timer quits its browsers once the deadline passes
+    :param email: String
+    :param password: String
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param email_links: list of string URLs
+    :param deadline: timestamp the job has to end by
+    :return: Boolean if the journal records every requested phase as finished
+    :raises WebDriverException: if phases are left after a browser error run_account logged and went past
+    """
+    global _JOB_DEADLINE
+    _JOB_DEADLINE = deadline
+    browser_errors = RUN_COUNTERS['browser_errors']
+    timer = threading.Timer(max(0.0, deadline - time.time()), quit_active_browsers)
+    timer.daemon = True
+    timer.start()
+    try:
+        run_account(email, password, args, search_terms_db, email_links)
+    except Exception:
+        # commands to a browser the timer quit fail with connection errors
+        if time.time() >= deadline:
+            raise TimeoutException('Account job ran out of time.')
+        raise
+    finally:
+        timer.cancel()
+        _JOB_DEADLINE = None
+        _ACTIVE_BROWSERS.clear()
+    journal = RunJournal(email)
+    finished = all(journal.finished(phase) for phase in requested_phases(args))
+    # phases left without a browser error, e.g. no search terms or no dailies, would be left again on a retry
+    if not finished and RUN_COUNTERS['browser_errors'] > browser_errors:
+        if time.time() >= deadline:
+            raise TimeoutException('Account job ran out of time.')
+        raise WebDriverException('Browser failed with phases left.')
+    return finished
+
+
+def log_run_counters():
+    """
+    Logs the RUN_COUNTERS totals of the run
+    :return: None
+    """
+    logging.info(msg=f'Page reloads: {RUN_COUNTERS["reloads"]}, reloads saved by polling: {RUN_COUNTERS["reloads_saved"]}')
+    queries = RUN_COUNTERS['search_queries']
+    logging.info(msg=f'Searches: {queries}, search points: {RUN_COUNTERS["search_points"]}, '
+                     f'{RUN_COUNTERS["search_points"] / max(1, queries):.1f} points per search')
+    logging.info(msg=f'Drag and drop quizzes: {RUN_COUNTERS["drag_quizzes"]}, moves: {RUN_COUNTERS["drag_quiz_moves"]}')
+
+
+def run_account_job(email, password, args, search_terms_db, email_links, deadline):
+    """
+    Runs one account inside a worker process, with its own log file and screenshot directory
+    :param email: String
+    :param password: String
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param email_links: list of string URLs
+    :param deadline: timestamp the job has to end by
+    :return: Boolean if every requested phase is finished
+    """
+    global SCREENSHOT_DIR
+    apply_args(args)
+    SCREENSHOT_DIR = os.path.join('logs', 'accounts', re.sub(r'[^\w.@-]', '_', email))
+    init_logging(log_level=args.log_level, log_dir=SCREENSHOT_DIR)
+    RUN_COUNTERS.clear()
+    _COMMAND_PROFILE.clear()
+    try:
+        return run_job(email, password, args, search_terms_db, email_links, deadline)
+    finally:
+        log_run_counters()
+        if args.profile:
+            write_command_profile(SCREENSHOT_DIR)
+
+
+def available_memory_mb():
+    """
+    Reads available memory from /proc/meminfo, or GlobalMemoryStatusEx on windows
+    :return: Int MB of available memory, None if it cannot be determined on this system
+    """
+    if platform.system() == 'Windows':
+        return windows_available_memory_mb()
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def windows_available_memory_mb():
+    """
+    :return: Int MB of available physical memory, None if the call fails
+    """
+    import ctypes
+
+    class MemoryStatusEx(ctypes.Structure):
+        _fields_ = [
+            ('dwLength', ctypes.c_ulong),
+            ('dwMemoryLoad', ctypes.c_ulong),
+            ('ullTotalPhys', ctypes.c_ulonglong),
+            ('ullAvailPhys', ctypes.c_ulonglong),
+            ('ullTotalPageFile', ctypes.c_ulonglong),
+            ('ullAvailPageFile', ctypes.c_ulonglong),
+            ('ullTotalVirtual', ctypes.c_ulonglong),
+            ('ullAvailVirtual', ctypes.c_ulonglong),
+            ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+        ]
+
+    status = MemoryStatusEx()
+    status.dwLength = ctypes.sizeof(MemoryStatusEx)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        return None
+    return status.ullAvailPhys // (1024 * 1024)
+
+
+def can_start_browser(start_times, memory_per_browser):
+    """
+    Admission control for worker processes, checks there is memory for one more chrome instance
+    :param start_times: list of start times of the running jobs
+    :param memory_per_browser: Int MB one browser needs
+    :return: Boolean
+    """
+    if not start_times:
+        return True
+    available = available_memory_mb()
+    if available is None:
+        return True
+    # browsers which are still starting up have not claimed their memory yet
+    warming_up = sum(1 for start_time in start_times if time.time() - start_time < BROWSER_WARMUP_SECONDS)
+    return available - warming_up * memory_per_browser >= memory_per_browser
+
+
+class AccountJob(object):
+    """
+    One account of the run and what happened to it, see JobScheduler
+    """
+
+    def __init__(self, email, password, priority):
+        self.email = email
+        self.password = password
+        self.priority = priority
+        self.status = 'pending'
+        self.attempts = 0
+        self.not_before = 0
+        self.started = None
+        self.seconds = 0.0
+        self.error = None
+
+
+class JobScheduler(object):
+    """
+    Orders the accounts of a run, furthest from their search caps first, retries ones a browser error
+    left unfinished with exponential backoff and starts nothing after the deadline
+    """
+
+    def __init__(self, accounts, args):
+        self.args = args
+        self.deadline = args.deadline or float('inf')
+        self.start_time = time.time()
+        self.jobs = []
+        phases = requested_phases(args)
+        for email, password in accounts:
+            journal = RunJournal(email, resume=not args.no_resume)
+            job = AccountJob(email, password, self.remaining_points(journal, phases))
+            if phases and all(journal.finished(phase) for phase in phases):
+                job.status = 'skipped'
+            self.jobs.append(job)
+        # stable sort keeps the shuffled order between accounts with the same priority
+        self.jobs.sort(key=lambda job: job.priority, reverse=True)
+
+    @staticmethod
+    def remaining_points(journal, phases):
+        """
+        Search points the journal says an account still has to earn today
+        :param journal: RunJournal obj
+        :param phases: list of requested phases
+        :return: Int, infinite if a search phase was never recorded today
+        """
+        remaining = 0
+        for phase in phases:
+            if phase not in ('mobile_search', 'pc_search') or journal.finished(phase):
+                continue
+            points = journal.phases.get(phase, {}).get('remaining')
+            if points is None:
+                return float('inf')
+            remaining += points
+        return remaining
+
+    def expired(self):
+        return time.time() >= self.deadline
+
+    def has_pending(self):
+        return not self.expired() and any(job.status == 'pending' for job in self.jobs)
+
+    def next_job(self):
+        """
+        :return: the pending AccountJob with the highest priority which may start now, None if there is none
+        """
+        if self.expired():
+            return None
+        now = time.time()
+        return next((job for job in self.jobs if job.status == 'pending' and job.not_before <= now), None)
+
+    def wait_for_next(self):
+        """
+        Sleeps until a retry may start, or the deadline
+        :return: Boolean if a job may start now
+        """
+        not_before = min((job.not_before for job in self.jobs if job.status == 'pending'), default=0)
+        time.sleep(max(0.0, min(not_before, self.deadline) - time.time()))
+        return not self.expired()
+
+    def start(self, job):
+        """
+        Marks a job running
+        :param job: AccountJob obj
+        :return: timestamp the job has to end by
+        """
+        job.status = 'running'
+        job.attempts += 1
+        job.started = time.time()
+        logging.info(msg=f'Starting {job.email}, attempt {job.attempts}.')
+        return min(job.started + self.args.job_timeout * 60, self.deadline)
+
+    def finish(self, job, finished, error=None):
+        """
+        Records the outcome of a job, queues a retry after a backoff if it failed with a browser error
+        A job that returned with phases left is not retried, the next attempt would leave them too
+        :param job: AccountJob obj
+        :param finished: Boolean if every requested phase is finished
+        :param error: exception the job raised, None if it returned
+        :return: None
+        """
+        job.seconds += time.time() - job.started
+        job.error = error
+        if finished:
+            job.status = 'finished'
+            return
+        if error is None:
+            job.status = 'unfinished'
+            logging.warning(msg=f'{job.email} ended with phases left, not retrying.')
+            return
+        if isinstance(error, WebDriverException) and job.attempts <= self.args.retries:
+            backoff = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1) * random.uniform(1, 1.5)
+            job.status = 'pending'
+            job.not_before = time.time() + backoff
+            logging.warning(msg=f'{job.email} unfinished ({type(error).__name__}), '
+                                f'retrying in {backoff:.0f} seconds.')
+        else:
+            job.status = 'timed out' if isinstance(error, TimeoutException) else 'failed'
+            logging.error(msg=f'{job.email} {job.status} after {job.attempts} attempts.', exc_info=error)
+
+    def log_summary(self):
+        for job in self.jobs:
+            if job.status in ('pending', 'running'):
+                job.status = 'not started' if not job.attempts else 'stopped at deadline'
+        statuses = Counter(job.status for job in self.jobs)
+        logging.info(msg=f'Run summary after {(time.time() - self.start_time) / 60:.1f} minutes: '
+                         + ', '.join(f'{count} {status}' for status, count in sorted(statuses.items())))
+        for job in self.jobs:
+            error = f' ({type(job.error).__name__})' if job.error else ''
+            logging.info(msg=f'    {job.email:<40} {job.status + error:<30} '
+                             f'{job.attempts} attempts {job.seconds / 60:>6.1f} minutes')
+
+
+def run_accounts_sequential(scheduler, args, search_terms_db, email_links):
+    """
+    Runs the jobs of a scheduler one at a time in this process
+    :param scheduler: JobScheduler obj
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param email_links: list of string URLs
+    :return: None
+    """
+    while scheduler.has_pending():
+        job = scheduler.next_job()
+        if job is None:
+            scheduler.wait_for_next()
+            continue
+        deadline = scheduler.start(job)
+        try:
+            scheduler.finish(job, run_job(job.email, job.password, args, search_terms_db, email_links, deadline))
+        except Exception as error:
+            scheduler.finish(job, False, error)
+
+
+def run_accounts_parallel(scheduler, args, search_terms_db, email_links):
+    """
+    Runs the jobs of a scheduler on a pool of worker processes, starting a new one only when there is memory for its browser
+    :param scheduler: JobScheduler obj
+    :param args: argparse object
+    :param search_terms_db: path of the search term store
+    :param email_links: list of string URLs
+    :return: None
+    """
+    running = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        while scheduler.has_pending() or running:
+            while len(running) < args.workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                if not can_start_browser([running_job.started for running_job in running.values()], args.worker_memory):
+                    logging.info(msg=f'Not enough memory for another browser, waiting. {len(running)} running.')
+                    break
+                deadline = scheduler.start(job)
+                future = executor.submit(
+                    run_account_job, job.email, job.password, args, search_terms_db, email_links, deadline)
+                running[future] = job
+            if not running:
+                scheduler.wait_for_next()
+                continue
+            done, _ = wait(running, timeout=BROWSER_WARMUP_SECONDS / 4, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    scheduler.finish(job, future.result())
+                    logging.info(msg=f'Finished {job.email} in {time.time() - job.started:.0f} seconds.')
+                except Exception as error:
+                    scheduler.finish(job, False, error)
+
+
+async def prefetch(args, executor):
+    """
+    Runs the http only work of a run at the same time, on threads sharing the pooled http session
+    :param args: argparse object
+    :param executor: ThreadPoolExecutor obj
+    :return: tuple of the search term store path, None if no searches are asked for, and the list of email links
+    """
+    loop = asyncio.get_event_loop()
+    search_terms_task = None
+    if args.mobile_mode or args.pc_mode:
+        search_terms_task = loop.run_in_executor(executor, get_search_terms, args.trends_geos)
+    reddit_task = None
+    if args.email_mode and args.reddit_links:
+        import redditScrape
+        reddit_task = loop.run_in_executor(executor, redditScrape.scrape_email_links, http_session())
+    # the browser setup waiting for this also finds the driver cached
+    driver_task = loop.run_in_executor(executor, chromedriver_path)
+    search_terms_db = await search_terms_task if search_terms_task else None
+    if reddit_task:
+        try:
+            await reddit_task
+        except Exception:
+            logging.exception(msg='Email links not refreshed from reddit, using email_links.txt.')
+    email_links = get_email_links() if args.email_mode else []
+    try:
+        await driver_task
+    except Exception:
+        logging.exception(msg='chromedriver check failed, retrying at browser setup.')
+    return search_terms_db, email_links
+
+
+def prefetch_run_inputs(args):
+    """
+    Gets the search terms, email links and chromedriver at the same time, while the first browser starts
+    The first browser is handed to open_browser, so the first search waits for chrome startup alone
+    Point totals are not prefetched, they need the cookies of a signed in browser
+    :param args: argparse object
+    :return: tuple of the search term store path and the list of email links
+    """
+    global _PRELAUNCHED_BROWSER
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prefetch')
+    # worker processes start their own browsers
+    if args.workers <= 1 and requested_phases(args):
+        if args.warm_pool > 0:
+            browser_pool(args).prelaunch()
+        else:
+            user_agent = MOBILE_USER_AGENT if args.mobile_mode else PC_USER_AGENT
+            _PRELAUNCHED_BROWSER = (user_agent, executor.submit(
+                browser_setup, args.headless_setting, user_agent, args.launch_profile))
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(prefetch(args, executor))
+    except BaseException:
+        discard_prelaunched_browser()
+        raise
+    finally:
+        loop.close()
+        # the browser keeps starting on its thread
+        executor.shutdown(wait=False)
+
+
+def discard_prelaunched_browser():
+    """
+    Quits the prelaunched browser if no account used it
+    :return: None
+    """
+    global _PRELAUNCHED_BROWSER
+    if _PRELAUNCHED_BROWSER is not None:
+        _, future = _PRELAUNCHED_BROWSER
+        _PRELAUNCHED_BROWSER = None
+        try:
+            future.result().quit()
+        except Exception:
+            logging.debug(msg='Prelaunched browser did not quit cleanly.', exc_info=True)
 
 
 if __name__ == '__main__':
     check_python_version()
-    if os.path.exists("drivers/chromedriver.exe"):
-        update_driver()
     try:
         # argparse
         parser = parse_args()
@@ -905,77 +3314,23 @@ if __name__ == '__main__':
         login_dict = get_login_info()
         logging.info(msg='logins retrieved.')
 
-        # get search terms
-        search_list = []
-        if parser.mobile_mode or parser.pc_mode:
-            search_list = get_search_terms()
+        # get search terms and URLs from emailed links while the first browser starts
+        search_terms_db, email_links = prefetch_run_inputs(parser)
 
-        # get URLs from emailed links
-        email_links = []
-        if parser.email_mode:
-            email_links = get_email_links()
-
-        # iter through accounts, search, and complete quizzes
+        # iter through accounts, search, and complete quizzes, furthest from their caps first
         login_dict_keys = list(login_dict.keys())
         random.shuffle(login_dict_keys)
-        for dict_key in login_dict_keys:
-            email = dict_key
-            password = login_dict[dict_key]
-
-            if parser.mobile_mode:
-                # MOBILE MODE
-                logging.info(msg='-------------------------MOBILE-------------------------')
-                # set up headless browser and mobile user agent
-                browser = browser_setup(parser.headless_setting, MOBILE_USER_AGENT)
-                try:
-                    log_in(email, password)
-                    browser.get(DASHBOARD_URL)
-                    time.sleep(3)
-                    try:
-                        iter_dailies()
-                        time.sleep(3)
-                        main_window()
-                    except:
-                        logging.info(msg=f'Mobile App Task not found')
-                    time.sleep(1)
-                    browser.get(BING_SEARCH_URL)
-                    # mobile search
-                    search(search_list, mobile_search=True)
-                    # get point totals if running just in mobile mode
-                    if not parser.pc_mode or not parser.quiz_mode or not parser.email_mode:
-                        get_point_total(mobile=True, log=True)
-                    browser.quit()
-                except KeyboardInterrupt:
-                    browser.quit()
-                except WebDriverException:
-                    logging.info(msg=f'WebDriverException while executing mobile portion', exc_info=True)
-                    browser.quit()
-
-            if parser.pc_mode or parser.quiz_mode or parser.email_mode:
-                # PC MODE
-                logging.info(msg='-------------------------PC-------------------------')
-                # set up edge headless browser and edge pc user agent
-                browser = browser_setup(parser.headless_setting, PC_USER_AGENT)
-                try:
-                    log_in(email, password)
-                    browser.get(DASHBOARD_URL)
-                    if parser.pc_mode:
-                        browser.get(BING_SEARCH_URL)
-                        # pc edge search
-                        search(search_list)
-                    if parser.quiz_mode:
-                        # complete quizzes
-                        iter_dailies()
-                    if parser.email_mode:
-                        click_email_links(email_links)
-                    # ensure logged in, log points
-                    ensure_pc_mode_logged_in()
-                    get_point_total(log=True)
-                except KeyboardInterrupt:
-                    print('Stopping Script...')
-                except WebDriverException:
-                    logging.error(msg=f'WebDriverException while executing pc portion', exc_info=True)
-                finally:
-                    browser.quit()
+        scheduler = JobScheduler([(dict_key, login_dict[dict_key]) for dict_key in login_dict_keys], parser)
+        try:
+            if parser.workers > 1:
+                run_accounts_parallel(scheduler, parser, search_terms_db, email_links)
+            else:
+                run_accounts_sequential(scheduler, parser, search_terms_db, email_links)
+        finally:
+            scheduler.log_summary()
+            discard_prelaunched_browser()
     except WebDriverException:
         logging.exception(msg='Failure at main()')
+    log_run_counters()
+    if PROFILE_COMMANDS and _COMMAND_PROFILE:
+        write_command_profile('logs')
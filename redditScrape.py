@@ -1,6 +1,5 @@
 from bs4 import BeautifulSoup
 import lxml.etree as ET
-import os
 import requests
 
 rssRedditURL = "https://www.reddit.com/r/MicrosoftRewards/search.rss?sort=new&restrict_sr=on&q=flair%3AMail%2BPoints"
@@ -9,26 +8,45 @@ headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/77.0.3865.120 Safari/537.36"
 }
 
-xmlData = requests.get(rssRedditURL, headers=headers).text
 
-xmlThing = open("tempFileDelete.txt", "wb")
-xmlThing.write(xmlData.encode())
-xmlThing.close()
-
-tree = ET.parse("tempFileDelete.txt")
-root = tree.getroot()
-
-os.remove("tempFileDelete.txt")
-linkList = []
-
-for content in root.findall(
-    "{http://www.w3.org/2005/Atom}entry/{http://www.w3.org/2005/Atom}content"
-):
-    soup = BeautifulSoup(content.text, "lxml")
-    for link in soup.findAll("a"):
-        if "aka.ms" in link.get("href") or "e.microsoft" in link.get("href"):
-            linkList.append(link.get("href"))
-
-with open("email_links.txt", "w") as filehandle:
-    for listitem in linkList:
-        filehandle.write("%s\n" % listitem)
+def fetch_email_links(session=None, timeout=10):
+    """
+    Gets the email point links posted to the reddit feed
+    :param session: requests.Session obj to send the request with, optional
+    :param timeout: seconds to wait for the feed
+    :return: list of string URLs
+    """
+    xmlData = (session or requests).get(rssRedditURL, headers=headers, timeout=timeout).content
+    root = ET.fromstring(xmlData)
+
+    linkList = []
+    for content in root.findall(
+        "{http://www.w3.org/2005/Atom}entry/{http://www.w3.org/2005/Atom}content"
+    ):
+        soup = BeautifulSoup(content.text, "lxml")
+        for link in soup.findAll("a"):
+            if "aka.ms" in link.get("href") or "e.microsoft" in link.get("href"):
+                linkList.append(link.get("href"))
+    return linkList
+
+
+def save_email_links(linkList, path="email_links.txt"):
+    with open(path, "w") as filehandle:
+        for listitem in linkList:
+            filehandle.write("%s\n" % listitem)
+
+
+def scrape_email_links(session=None, path="email_links.txt"):
+    """
+    Replaces the email links file with the links of the reddit feed
+    :param session: requests.Session obj to send the request with, optional
+    :param path: file ms_rewards.py reads the links from
+    :return: list of string URLs
+    """
+    linkList = fetch_email_links(session)
+    save_email_links(linkList, path)
+    return linkList
+
+
+if __name__ == "__main__":
+    scrape_email_links()